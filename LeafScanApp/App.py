@@ -3,12 +3,18 @@ from flask_cors import CORS
 from core.paths import ensure_dirs
 from routes import register_routes
 from core import cache
+from storage import schedule_maintenance
+from core.recovery import recover_jobs
+from core.scheduler import start_schedulers
 
 def create_app():
     app = Flask(__name__, static_folder="static")
     CORS(app)
     #ensure_dirs()
     app.cache = cache.get_cache()
+    start_schedulers()
+    schedule_maintenance()
+    recover_jobs()
     register_routes(app)
     return app
 
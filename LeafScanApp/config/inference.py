@@ -0,0 +1,48 @@
+# Original area micro-batching
+ORIGINAL_BATCH_WINDOW_S = 0.005   # how long to hold a batch open for more rows
+ORIGINAL_BATCH_MAX_ROWS = 64      # flush early once this many rows are pending
+
+# LeafScan video inference
+LEAFSCAN_WORKERS = 2              # process pool size; 0 runs LeafScan in the scheduler thread
+LEAFSCAN_MP_CONTEXT = "spawn"     # fresh interpreters, nothing inherited from the server threads
+SIMULATED_THREADS = 3             # concurrent videos when LeafScan runs in-thread
+
+# Job queue
+JOB_QUEUE_BACKEND = "redis"       # "redis" keeps queued jobs across restarts; "memory" does not
+RECOVERY_SCAN_COUNT = 1000        # job hashes read per round trip by the startup recovery pass
+
+# Inference lanes, one per JobTypes stage, so fast stages never queue behind videos
+INFERENCE_LANES = {
+    "original_area": 2,                               # worker threads per lane
+    "simulated_area": LEAFSCAN_WORKERS or SIMULATED_THREADS,
+    "defoliation": 2,
+}
+PRIORITY_CLASSES = ("interactive", "normal", "background")  # dispatch order within a lane
+PRIORITY_BOOST_TTL_S = 300        # how long a /inference poll keeps an entry interactive
+
+# Stage DAG (core/dag.py)
+INLINE_STAGES = ("out_defoliation",)  # cheap stages run in the thread that completed their inputs
+
+# Pushed results: long-poll (/inference/<id>?wait=) and SSE (/inference/<id>/events)
+RESULT_WAIT_MAX_S = 30            # longest a long-poll request is held open
+RESULT_STREAM_MAX_S = 600         # an SSE stream closes after this; clients reconnect
+RESULT_STREAM_HEARTBEAT_S = 15    # comment line sent on idle streams to keep proxies from closing them
+RESULT_MAX_WAITERS = 512          # held requests per process; beyond this, answer immediately
+
+# Bulk status (/inference/bulk)
+BULK_STATUS_MAX_IDS = 1000        # entry ids accepted per request
+BULK_STATUS_PAGE_SIZE = 200       # entries answered per page unless the request asks for fewer
+
+# Cooperative cancellation
+CANCEL_CHECK_INTERVAL_S = 0.5     # how often a LeafScan run re-reads its input version
+
+# Frame sampling before LeafScan (models/leafscan_model.py)
+FRAME_STRIDE = 1                  # hand LeafScan every Nth frame; 1 scans the video as uploaded
+FRAME_KEYFRAMES_ONLY = False      # hand it only keyframes instead (FFmpeg backend)
+FRAME_BUFFER_SIZE = 16            # decoded frames held between the decoder and the encoder
+
+# Original area prediction memo
+ORIGINAL_MEMO_SIZE = 4096         # entries kept per process; 0 disables the memo
+ORIGINAL_MEMO_WIDTH_STEP = 0.0    # round widths to this step before lookup/predict; 0 keeps them exact
+ORIGINAL_MEMO_REDIS = False       # share predictions across compute nodes through Redis
+ORIGINAL_MEMO_TTL_S = 3600 * 24 * 7
@@ -1,4 +1,35 @@
 DATA_STORE_URL = "http://149.165.151.21:8000" # DATA NODE
 #DATA_STORE_URL = "http://192.168.12.178:8000" # LOCAL SERVER
+#DATA_STORE_URL = "http://127.0.0.1:8000" # STUB (python -m storage.StubDataNode)
 CACHE_LOCATION = "/tmp/leafscan/cache"
-CACHE_MAX_BYTES = 5e9
\ No newline at end of file
+CACHE_MAX_BYTES = 5e9
+UPLOAD_TTL_S = 3600 * 24 # how long an unfinished chunked upload can be resumed
+RESULT_INDEX_TTL_S = 3600 * 24 * 7 # how long results stay reusable by input hash
+EVICTION_POLICY = "completed_first" # "lru", "gdsf" or "completed_first" (see storage/Eviction.py)
+EVICTION_CLAIM_TTL_S = 300 # a victim claimed by a pass that never purged it becomes pickable again
+BYTES_RECONCILE_INTERVAL_S = 600 # full rescan of entry sizes against the recorded bytes
+CACHE_HIGH_WATERMARK = 0.9 # background eviction starts above this fraction of CACHE_MAX_BYTES
+CACHE_LOW_WATERMARK = 0.75 # ...and evicts down to this fraction
+CACHE_HARD_LIMIT = 1.0 # writers only wait on eviction above this fraction
+EVICTION_BATCH_SIZE = 16 # victims picked and purged per round trip
+EVICTION_SCAN_WINDOW = 128 # ranked set entries read per round trip while looking for victims
+EXPIRED_SWEEP_INTERVAL_S = 60 # expired jobs are swept on this schedule, not only under pressure
+VERSION_LOCK_TIMEOUT_S = 30 # a step's inputs and results are never written at the same time
+UPLOAD_CONCURRENCY = 8 # transfers to the data node at once, each over a pooled keep-alive connection
+UPLOAD_TIMEOUT_S = 120
+UPLOAD_MAX_ATTEMPTS = 10 # failed attempts before an upload is dropped (startup recovery requeues it)
+UPLOAD_BACKOFF_BASE_S = 2 # retries wait a random 0..base*2^(attempt-1) seconds...
+UPLOAD_BACKOFF_MAX_S = 300 # ...capped here; the worker is free meanwhile
+UPLOAD_BREAKER_THRESHOLD = 5 # outages in a row (connection errors, timeouts, 5xx) that pause all uploads
+UPLOAD_BREAKER_COOLDOWN_S = 30 # first pause; each failed probe doubles it...
+UPLOAD_BREAKER_MAX_COOLDOWN_S = 600 # ...up to this
+UPLOAD_BATCH_MAX_BYTES = 256 * 1024 # artifacts up to this size (not videos) share one request...
+UPLOAD_BATCH_WINDOW_S = 2.0 # ...collected for this long...
+UPLOAD_BATCH_MAX_ITEMS = 64 # ...or until this many are waiting
+UPLOAD_VIDEO_CONCURRENCY = 2 # videos upload on their own workers, so results never queue behind them
+UPLOAD_BANDWIDTH_BPS = 0 # bytes/s for all uploads of this process together; 0 = uncapped
+UPLOAD_TRANSFER_BPS = 0 # bytes/s for any one transfer; 0 = uncapped
+UPLOAD_RATE_BURST_BYTES = 256 * 1024 # most bytes granted at once under a cap
+UPLOAD_RATE_WINDOW_S = 10 # reported upload throughput is averaged over this window
+UPLOAD_RANGED_MIN_BYTES = 16 * 1024 * 1024 # files this large go in ranged chunks that resume after an interruption...
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024 # ...of this size
@@ -1,10 +1,14 @@
 import time
 import json
+import hashlib
 import requests
 from datetime import datetime
+from pathlib import Path
 from typing import Dict
+from contextlib import contextmanager
 from storage import ComputeCache, FileSystemComputeCache, get_meta_store, schedule_upload, ARTIFACTS, JobFields, JobTypes
-from core.dependencies import get_dependents
+from core.dependencies import invalidated_by
+from core.versions import InputVersion
 from config.storage import CACHE_LOCATION
 
 CACHE_SCHEMA = {
@@ -53,6 +57,10 @@ class CacheService:
         else:
             return f"{entry_id}_{step}.json"
 
+    def artifact_path(self, entry_id: str, step: str) -> Path:
+        """Local path of an entry's artifact for step; uploads read it from there."""
+        return self.backend.artifact_path(self._artifact_name(entry_id, step), entry_id=entry_id)
+
     def reset(self):
         self.meta.reset()
         self.backend.clear()
@@ -78,15 +86,22 @@ class CacheService:
     def save(self, entry_id: str, step: str, state: Dict):
         state["last_updated"] = datetime.utcnow().isoformat() + "Z"
         artifact = self._artifact_name(entry_id, step)
-        self.backend.put(artifact, json.dumps(state, indent=2).encode("utf-8"), entry_id=entry_id)
-        self.meta.update_bytes(entry_id)
+        written = self.backend.put(artifact, json.dumps(state, indent=2).encode("utf-8"), entry_id=entry_id)
+        self.meta.add_bytes(entry_id, written.delta)
+        self._record_checksum(entry_id, step, written.digest, written.size)
     
         if state.get("status") == "completed":
-            self.meta.update_field(entry_id, ARTIFACTS[step].upload_flag)
-            local_path = self.backend._artifact_path(entry_id, artifact)
-            schedule_upload(entry_id, step, local_path)
+            # Set back to 1 by the upload job once the data node has it
+            self.meta.update_field(entry_id, ARTIFACTS[step].upload_flag, 0)
+            self.meta.defer(schedule_upload, entry_id, step, self.artifact_path(entry_id, step))
+
+        self.meta.ensure_space()
 
-        self.meta.evict_jobs_for_space()
+    def _record_checksum(self, entry_id: str, step: str, digest: str, size: int):
+        # Uploads send and verify this instead of reading the artifact again
+        artifact = ARTIFACTS[step]
+        self.meta.update_field(entry_id, artifact.checksum_field, digest)
+        self.meta.update_field(entry_id, artifact.size_field, size)
 
     def sanitize(self, step: str, state: Dict) -> Dict:
         schema = CACHE_SCHEMA.get(step)
@@ -104,6 +119,11 @@ class CacheService:
         return state
 
     def update(self, entry_id: str, step: str, new_params: Dict = None, new_data=False) -> Dict:
+        # Runs of this step commit under the same lock (see commit_run)
+        with self.meta.version_lock(entry_id, ARTIFACTS[step].version_field):
+            return self._update(entry_id, step, new_params, new_data)
+
+    def _update(self, entry_id: str, step: str, new_params: Dict = None, new_data=False) -> Dict:
         
         # Load and Sanitize
         state = self.load(entry_id, step)
@@ -127,7 +147,8 @@ class CacheService:
         if not changed_params:
             return
 
-        # Update current entry
+        # Update current entry; runs working from the old inputs stop at their next checkpoint
+        self.meta.bump_version(entry_id, ARTIFACTS[step].version_field)
         self.meta.update_field(entry_id, ARTIFACTS[step].output_flag, 0)
 
         state["params"].update(changed_params)
@@ -142,11 +163,13 @@ class CacheService:
 
         # Update all dependents
         for param in changed_params.keys():
-            param_field = param
-            self.meta.update_field(entry_id, param_field, 1)
-            
-            for dep in get_dependents(entry_id, param_field):
-                self.meta.update_field(entry_id, dep, 0)   
+            self.meta.update_field(entry_id, param, 1)
+
+        for dep in invalidated_by(*changed_params):
+            self.meta.update_field(entry_id, dep, 0)
+            if FLAG_TO_JOB.get(dep, step) != step:
+                # Downstream stages are stale too, and may be dispatched again
+                self.meta.bump_version(entry_id, ARTIFACTS[FLAG_TO_JOB[dep]].version_field)
 
         print(f">>>> Update {entry_id} >>>>")
         print(self.meta.get_entry(entry_id))
@@ -155,6 +178,64 @@ class CacheService:
 
         return state
 
+    # ----------------------------
+    # Versioned runs
+    # ----------------------------
+
+    def start_run(self, entry_id: str, step: str, state: Dict = None):
+        """Returns (InputVersion, state) read together, so the state matches its version."""
+        field = ARTIFACTS[step].version_field
+        with self.meta.version_lock(entry_id, field):
+            version = InputVersion(entry_id, field, self.meta.get_version(entry_id, field))
+            if not state:
+                state = self.load(entry_id, step)
+        return version, state
+
+    @contextmanager
+    def commit_run(self, version: InputVersion):
+        """
+        Yields whether the run's inputs are still current. Writes made in the
+        block reach Redis before the lock is released, so a stale run never
+        lands on top of newer inputs.
+        """
+        with self.meta.version_lock(version.entry_id, version.field):
+            current = not version.superseded()
+            yield current
+            if current:
+                self.meta.commit()
+
+    # ----------------------------
+    # Result reuse by input hash
+    # ----------------------------
+
+    def input_hash(self, entry_id: str, step: str, params: Dict) -> str | None:
+        """Hash of a step's canonicalized inputs, shared by every entry with the same inputs."""
+        # Original area predictions are memoized by the model itself (run_model)
+        if step == JobTypes.SIMULATED_AREA:
+            video_hash = self.meta.get_field(entry_id, JobFields.VIDEO_HASH)
+            if not video_hash or self.meta.get_upload(entry_id) is not None:
+                # Unknown, or about to be replaced by a video still arriving
+                return None
+            key = {
+                JobFields.IN_VIDEO: video_hash,
+                JobFields.IN_LENGTH: float(params[JobFields.IN_LENGTH]),
+            }
+        else:
+            return None
+
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def cached_result(self, entry_id: str, step: str, params: Dict):
+        """Returns (input_hash, result) where result is None if no entry computed it yet."""
+        input_hash = self.input_hash(entry_id, step, params)
+        if input_hash is None:
+            return None, None
+        return input_hash, self.meta.get_result(step, input_hash)
+
+    def store_result(self, step: str, input_hash: str | None, result):
+        if input_hash is not None:
+            self.meta.set_result(step, input_hash, result)
+
     def video_exists(self, entry_id: str) -> bool:
         artifact = self._artifact_name(entry_id, "video")
         return self.backend.exists(artifact, entry_id=entry_id)
@@ -163,13 +244,85 @@ class CacheService:
         artifact = self._artifact_name(entry_id, "video")
         return self.backend.get_stream(artifact, entry_id=entry_id)
 
+    def video_local_path(self, entry_id: str):
+        artifact = self._artifact_name(entry_id, "video")
+        return self.backend.local_path(artifact, entry_id=entry_id)
+
     def save_video_stream(self, entry_id: str, file_storage):
         artifact = self._artifact_name(entry_id, "video")
-        self.backend.put_stream(artifact, file_storage.stream, entry_id=entry_id)
-        self.meta.update_bytes(entry_id)
+        written = self.backend.put_stream(artifact, file_storage.stream, entry_id=entry_id)
+        self._video_saved(entry_id, written.digest, written.size, written.delta)
+
+    # ----------------------------
+    # Chunked video uploads
+    # ----------------------------
+
+    def _partial_video_name(self, entry_id: str) -> str:
+        return self._artifact_name(entry_id, "video") + ".part"
+
+    def init_video_upload(self, entry_id: str, filename: str, size: int) -> Dict:
+        """Open (or resume) a chunked upload. Returns the ranges received so far."""
+        upload = self.meta.get_upload(entry_id)
+        if upload and upload["filename"] == filename and upload["size"] == size:
+            return upload
+
+        # New or different video: start over
+        delta = self.backend.delete(self._partial_video_name(entry_id), entry_id=entry_id)
+        self.meta.add_bytes(entry_id, delta)
+        self.meta.init_upload(entry_id, filename, size, self._partial_video_name(entry_id))
+        return self.meta.get_upload(entry_id)
+
+    def save_video_chunk(self, entry_id: str, offset: int, chunk: bytes) -> Dict:
+        upload = self.meta.get_upload(entry_id)
+        if upload is None:
+            raise KeyError(f"No open upload for {entry_id}")
+        if offset < 0 or offset + len(chunk) > upload["size"]:
+            raise ValueError(f"Chunk [{offset}, {offset + len(chunk)}) outside of {upload['size']} bytes")
+
+        delta = self.backend.put_chunk(self._partial_video_name(entry_id), chunk, entry_id=entry_id, offset=offset)
+        self.meta.add_upload_range(entry_id, offset, offset + len(chunk))
+        self.meta.add_bytes(entry_id, delta)
+        return self.meta.get_upload(entry_id)
+
+    def finalize_video_upload(self, entry_id: str) -> Dict:
+        """Promote a fully received upload to the cached video."""
+        upload = self.meta.get_upload(entry_id)
+        if upload is None:
+            raise KeyError(f"No open upload for {entry_id}")
+        if not upload["complete"]:
+            return upload
+
+        artifact = self._artifact_name(entry_id, "video")
+        delta = self.backend.move(self._partial_video_name(entry_id), artifact, entry_id=entry_id)
+        self.meta.clear_upload(entry_id)
+
+        # Hashed as the chunks were written; only out-of-order ones are read back
+        digest = self.backend.checksum(artifact, entry_id=entry_id)
+        self._video_saved(entry_id, digest, upload["size"], delta)
+        return upload
+
+    def _video_saved(self, entry_id: str, digest: str, size: int, delta: int):
+        artifact = self._artifact_name(entry_id, "video")
+        self._dedup_video(entry_id, artifact, digest, size)
+        self._record_checksum(entry_id, "video", digest, size)
+        # The video is now a blob hardlink, charged through its reference instead
+        self.meta.add_bytes(entry_id, delta - size)
+
+        self.meta.update_field(entry_id, ARTIFACTS["video"].upload_flag, 0)
+        self.meta.defer(schedule_upload, entry_id, "video", self.artifact_path(entry_id, "video"))
+
+        self.meta.ensure_space()
 
-        local_path = self.backend._artifact_path(entry_id, artifact)
-        self.meta.update_field(entry_id, ARTIFACTS["video"].upload_flag)
-        schedule_upload(entry_id, "video", local_path)
+    def _dedup_video(self, entry_id: str, artifact: str, digest: str, size: int):
+        """Hardlink identical videos to one blob and move this entry's reference to it."""
+        if self.backend.dedup_blob(digest, artifact, entry_id=entry_id):
+            print(f"♻️ Video {entry_id} matches stored blob {digest[:12]}")
+
+        old_digest = self.meta.get_field(entry_id, JobFields.VIDEO_HASH)
+        if old_digest == digest:
+            return
 
-        self.meta.evict_jobs_for_space()
\ No newline at end of file
+        self.meta.add_blob_ref(digest, size)
+        self.meta.update_field(entry_id, JobFields.VIDEO_HASH, digest)
+        if old_digest:
+            self.meta.release_blob_ref(old_digest)
@@ -0,0 +1,48 @@
+from config.inference import INLINE_STAGES
+from core.dependencies import UPSTREAM_DEPENDENCY_SCHEMA, DOWNSTREAM_DEPENDENCY_SCHEMA
+from storage import get_meta_store, ARTIFACTS
+
+# Input version of each output stage; a stage is dispatched once per version
+_VERSION_FIELDS = {a.output_flag: a.version_field for a in ARTIFACTS.values() if a.output_flag}
+
+def _stages():
+    # Imported here: the inference jobs themselves call advance()
+    from inference.all_schedulers import SCHEDULERS, RUNNERS
+    return SCHEDULERS, RUNNERS
+
+def runnable_after(*flags) -> list:
+    """Stages directly downstream of flags, in schema order, each once."""
+    stages = []
+    for flag in flags:
+        for stage in DOWNSTREAM_DEPENDENCY_SCHEMA.get(flag, []):
+            if stage not in stages:
+                stages.append(stage)
+    return stages
+
+def dispatch(entry_id: str, *stages) -> dict:
+    """
+    Start each of stages whose inputs are all set, exactly once per input
+    version. INLINE_STAGES run right here; the rest go to their lane.
+    Stages with no scheduler (uploads) are left to the cache.
+    Returns stage -> (job, jobs ahead) for what was dispatched now; inline
+    stages map to (None, 0).
+    """
+    schedulers, runners = _stages()
+    meta = get_meta_store()
+    dispatched = {}
+    for stage in stages:
+        if stage not in schedulers:
+            continue
+        if not meta.claim_stage(entry_id, stage, _VERSION_FIELDS[stage], UPSTREAM_DEPENDENCY_SCHEMA[stage]):
+            continue
+        if stage in INLINE_STAGES:
+            print(f"⚡ Running {stage} inline for {entry_id}")
+            runners[stage](entry_id, None)
+            dispatched[stage] = (None, 0)
+        else:
+            dispatched[stage] = schedulers[stage](entry_id, None)
+    return dispatched
+
+def advance(entry_id: str, *flags):
+    """Called once flags were set for entry_id: dispatches every stage those flags made runnable."""
+    return dispatch(entry_id, *runnable_after(*flags))
@@ -31,80 +31,121 @@ DOWNSTREAM_DEPENDENCY_SCHEMA = {
 }
 
 
-def dependencies_ready(entry_id: str, stage: str):
+# ---- Compiled once at import ----
+
+def _topological_order():
+    nodes = set(UPSTREAM_DEPENDENCY_SCHEMA) | set(DOWNSTREAM_DEPENDENCY_SCHEMA)
+    for deps in list(UPSTREAM_DEPENDENCY_SCHEMA.values()) + list(DOWNSTREAM_DEPENDENCY_SCHEMA.values()):
+        nodes.update(deps)
+
+    order, state = [], {}
+    def visit(node):
+        if state.get(node) == "done":
+            return
+        if state.get(node) == "visiting":
+            raise ValueError(f"Dependency cycle through {node}")
+        state[node] = "visiting"
+        for dep in UPSTREAM_DEPENDENCY_SCHEMA.get(node, []):
+            visit(dep)
+        state[node] = "done"
+        order.append(node)
+
+    for node in sorted(nodes):
+        visit(node)
+    return order
+
+# Every field, inputs before the stages computed from them
+TOPOLOGICAL_ORDER = _topological_order()
+_RANK = {node: i for i, node in enumerate(TOPOLOGICAL_ORDER)}
+
+def _closure(schema, node, seen):
+    for dep in schema.get(node, []):
+        if dep not in seen:
+            seen.add(dep)
+            _closure(schema, dep, seen)
+    return seen
+
+# Computable stages a stage's readiness depends on, itself last, in evaluation order
+_PLANS = {
+    stage: sorted(
+        {dep for dep in _closure(UPSTREAM_DEPENDENCY_SCHEMA, stage, set()) if dep in UPSTREAM_DEPENDENCY_SCHEMA} | {stage},
+        key=_RANK.get,
+    )
+    for stage in UPSTREAM_DEPENDENCY_SCHEMA
+}
+
+# Everything downstream of a field, i.e. what goes stale when it changes
+_DEPENDENTS = {
+    node: frozenset(_closure(DOWNSTREAM_DEPENDENCY_SCHEMA, node, set()))
+    for node in DOWNSTREAM_DEPENDENCY_SCHEMA
+}
+
+def _is_set(flags, field) -> bool:
+    return bool(int(flags.get(field) or 0))
+
+def _resolve(stage: str, flags: dict) -> dict:
+    """(ready, missing, rerunnable) for stage and each computable stage upstream of it."""
+    results = {}
+    for node in _PLANS.get(stage, [stage]):
+        ready, missing, rerunnable = True, [], []
+        for dep in UPSTREAM_DEPENDENCY_SCHEMA.get(node, []):
+            if _is_set(flags, dep):
+                continue
+            if dep in UPSTREAM_DEPENDENCY_SCHEMA:
+                # A computable stage: take its already evaluated readiness
+                sub_ready, sub_missing, sub_rerunnable = results[dep]
+                missing.extend(sub_missing)
+                rerunnable.extend(sub_rerunnable)
+                if sub_ready:
+                    rerunnable.append(dep)
+                else:
+                    ready = False
+            else:
+                # Leaf param missing
+                missing.append(dep)
+                ready = False
+        results[node] = (ready, missing, rerunnable)
+    return results
+
+def dependencies_ready(entry_id: str, stage: str, flags: dict = None):
     """
     Returns:
       ready: bool
       missing: list of missing upstream fields
       rerunnable: list of upstream jobs that can be rescheduled
+    flags is a snapshot of the job hash; read with one HGETALL if not given.
     """
-    meta = get_meta_store()
-
-    ready = True
-    missing = []
-    rerunnable = []
-
-    required = UPSTREAM_DEPENDENCY_SCHEMA.get(stage, [])
-
-    for dep in required:
-        flag = bool(int(meta.get_field(entry_id, dep)))
+    if flags is None:
+        flags = get_meta_store().get_entry(entry_id)
+    return _resolve(stage, flags)[stage]
 
-        if flag:
-            continue
-
-        # Missing upstream
-        if dep in UPSTREAM_DEPENDENCY_SCHEMA:
-            # It's a computable stage — recurse
-            sub_ready, sub_missing, sub_rerunnable = dependencies_ready(entry_id, dep)
-            missing.extend(sub_missing)
-            rerunnable.extend(sub_rerunnable)
-
-            if sub_ready:
-                rerunnable.append(dep)
-            else:
-                ready = False
-        else:
-            # Leaf param missing
-            missing.append(dep)
-            ready = False
-
-    return ready, missing, rerunnable
-
-def check_dependencies(entry_id: str, stage: str, missing_params):
+def check_dependencies(entry_id: str, stage: str, missing_params, flags: dict = None):
     """
-    Recursively check upstream inputs.
+    Check upstream inputs; missing leaf params are appended to missing_params.
+    Returns (all satisfied, direct upstream stages that can be rescheduled).
     """
-    meta = get_meta_store()
-    required_params = UPSTREAM_DEPENDENCY_SCHEMA.get(stage, [])
-
-    all_satisfied = True
-    jobs_to_reschedule = []
-    for r in required_params:
-        value = meta.get_field(entry_id, r)
-        is_present = bool(int(value))
-
-        sub_satisfied = True
-        if not is_present:
-            if r in UPSTREAM_DEPENDENCY_SCHEMA:
-                sub_satisfied = check_dependencies(entry_id, r, missing_params)
-
-                if sub_satisfied:
-                    jobs_to_reschedule.append(r)
-            else:
-                missing_params.append(r)
-                sub_satisfied = False
-        
-        all_satisfied = all_satisfied and sub_satisfied
-    
+    if flags is None:
+        flags = get_meta_store().get_entry(entry_id)
+    results = _resolve(stage, flags)
+    all_satisfied, missing, _ = results[stage]
+    missing_params.extend(missing)
+
+    jobs_to_reschedule = [
+        dep for dep in UPSTREAM_DEPENDENCY_SCHEMA.get(stage, [])
+        if dep in UPSTREAM_DEPENDENCY_SCHEMA and not _is_set(flags, dep) and results[dep][0]
+    ]
     return all_satisfied, jobs_to_reschedule
 
 def get_dependents(entry_id: str, changed_field: str, visited=None):
-    if visited is None:
-        visited = set()
-
-    for dep in DOWNSTREAM_DEPENDENCY_SCHEMA.get(changed_field, []):
-        if dep not in visited:
-            visited.add(dep)
-            get_dependents(entry_id, dep, visited)
-
-    return visited
+    dependents = set(_DEPENDENTS.get(changed_field, ()))
+    if visited is not None:
+        visited.update(dependents)
+        return visited
+    return dependents
+
+def invalidated_by(*fields) -> list:
+    """Union of everything downstream of fields, in topological order."""
+    dependents = set()
+    for field in fields:
+        dependents |= _DEPENDENTS.get(field, frozenset())
+    return sorted(dependents, key=_RANK.get)
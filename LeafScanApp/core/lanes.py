@@ -0,0 +1,255 @@
+import sys
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+
+from apscheduler.executors.base import BaseExecutor, run_job
+
+from config.inference import PRIORITY_CLASSES, PRIORITY_BOOST_TTL_S
+from core.metrics import histogram
+
+DEFAULT_PRIORITY = "normal"
+LANE_WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 15, 60, 300)
+
+# entry_id -> (priority class, expires at); entries not listed run as DEFAULT_PRIORITY
+_priorities = {}
+_priorities_lock = threading.Lock()
+
+# lane name -> LaneExecutor
+_lanes = {}
+
+def priority_of(entry_id) -> str:
+    with _priorities_lock:
+        cls, expires = _priorities.get(entry_id, (DEFAULT_PRIORITY, None))
+        if expires is not None and expires < time.monotonic():
+            del _priorities[entry_id]
+            return DEFAULT_PRIORITY
+        return cls
+
+def prioritize(entry_id, cls="interactive", ttl=PRIORITY_BOOST_TTL_S):
+    """Run entry_id's pending and upcoming jobs as cls for ttl seconds; never demotes."""
+    rank = PRIORITY_CLASSES.index(cls)
+    now = time.monotonic()
+    with _priorities_lock:
+        for stale in [e for e, (_, expires) in _priorities.items() if expires < now]:
+            del _priorities[stale]
+        current = _priorities.get(entry_id)
+        if current and PRIORITY_CLASSES.index(current[0]) < rank:
+            return
+        _priorities[entry_id] = (cls, now + ttl)
+
+    for lane in list(_lanes.values()):
+        lane.reprioritize(entry_id, rank)
+
+def get_lane(name):
+    return _lanes[name]
+
+def lane_depth(name) -> int:
+    lane = _lanes.get(name)
+    return lane.depth() if lane else 0
+
+def lane_stats() -> dict:
+    return {name: lane.stats() for name, lane in list(_lanes.items())}
+
+def pending_entries() -> set:
+    """Entries with a job handed to a lane but not started yet."""
+    entries = set()
+    for lane in list(_lanes.values()):
+        entries.update(lane.pending_entries())
+    return entries
+
+def queue_positions() -> dict:
+    """entry_id -> {lane: jobs ahead of its pending job}, for every entry waiting in a lane."""
+    positions = {}
+    for name, lane in list(_lanes.items()):
+        for entry_id, ahead in lane.positions().items():
+            positions.setdefault(entry_id, {})[name] = ahead
+    return positions
+
+def _client_of(entry_id) -> str:
+    # Imported here: storage imports the scheduler, which builds the lanes
+    from storage import get_meta_store, JobFields
+    return get_meta_store().r.hget(f"job:{entry_id}", JobFields.CLIENT) or entry_id
+
+
+class _Pending:
+    __slots__ = ("job", "run_times", "entry_id", "client", "rank", "start", "seq", "queued_at")
+
+    def __init__(self, job, run_times, entry_id, client, rank, start, seq):
+        self.job = job
+        self.run_times = run_times
+        self.entry_id = entry_id
+        self.client = client
+        self.rank = rank
+        self.start = start
+        self.seq = seq
+        self.queued_at = time.monotonic()
+
+
+class LaneExecutor(BaseExecutor):
+    """
+    APScheduler executor with its own worker threads for one inference stage.
+
+    Due jobs wait in a heap ordered by priority class, then by a start-time
+    fair queuing tag per client: a client's next job starts after its previous
+    one, so a burst from one client interleaves with everyone else's work
+    instead of queuing it. /inference polls re-rank an entry's pending jobs.
+    """
+
+    def __init__(self, name, max_workers):
+        super().__init__()
+        self.name = name
+        self.max_workers = int(max_workers)
+        self._cond = threading.Condition()
+        self._heap = []
+        self._pending = {}      # job id -> _Pending
+        self._running = {}      # job id -> Job
+        self._dirty = {}        # job id -> args for one follow-up run
+        self._finish = {}       # client -> fair queuing tag after its last queued job
+        self._vtime = 0         # tag of the last job dispatched
+        self._seq = itertools.count()
+        self._stopping = False
+        self._threads = []
+        self._wait = histogram(f"lane_wait_s_{name}", LANE_WAIT_BUCKETS)
+        _lanes[name] = self
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        with self._cond:
+            self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"lane-{self.name}-{i}", daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def shutdown(self, wait=True):
+        # Workers drain what is already queued, like a thread pool
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def _do_submit_job(self, job, run_times):
+        entry_id = job.args[0] if job.args else job.id
+        client = _client_of(entry_id)
+        rank = PRIORITY_CLASSES.index(priority_of(entry_id))
+        with self._cond:
+            start = max(self._vtime, self._finish.get(client, 0))
+            self._finish[client] = start + 1
+            item = _Pending(job, run_times, entry_id, client, rank, start, next(self._seq))
+            self._pending[job.id] = item
+            heapq.heappush(self._heap, (rank, start, item.seq, item))
+            self._cond.notify()
+
+    def claim(self, job_id, args):
+        """
+        Fold a submission into job_id's waiting or running run.
+        Returns (job, jobs ahead), or None if job_id is in neither.
+        """
+        with self._cond:
+            item = self._pending.get(job_id)
+            if item is not None:
+                if args[-1] is not None:
+                    item.job.args = tuple(args)
+                key = (item.rank, item.start, item.seq)
+                ahead = sum(1 for other in self._pending.values() if (other.rank, other.start, other.seq) < key)
+                return item.job, ahead
+            job = self._running.get(job_id)
+            if job is not None:
+                # Newest inputs win; however many arrive, one rerun follows
+                self._dirty[job_id] = list(args)
+                return job, 0
+        return None
+
+    def reprioritize(self, entry_id, rank):
+        with self._cond:
+            for item in self._pending.values():
+                if item.entry_id == entry_id and item.rank != rank:
+                    # The old heap slot goes stale and is skipped when popped
+                    item.rank = rank
+                    heapq.heappush(self._heap, (rank, item.start, item.seq, item))
+
+    def _pop(self):
+        while self._heap:
+            rank, _, _, item = heapq.heappop(self._heap)
+            if self._pending.get(item.job.id) is item and item.rank == rank:
+                del self._pending[item.job.id]
+                return item
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                item = self._pop()
+                while item is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                    item = self._pop()
+                self._running[item.job.id] = item.job
+                self._vtime = max(self._vtime, item.start)
+                # Clients with nothing queued past the clock start fresh
+                for client in [c for c, tag in self._finish.items() if tag <= self._vtime]:
+                    del self._finish[client]
+
+            self._wait.observe(time.monotonic() - item.queued_at)
+            try:
+                events = run_job(item.job, item.job._jobstore_alias, item.run_times, self._logger.name)
+            except BaseException:
+                _, exc, tb = sys.exc_info()
+                self._run_job_error(item.job.id, exc, tb)
+            else:
+                self._run_job_success(item.job.id, events)
+            finally:
+                with self._cond:
+                    del self._running[item.job.id]
+                    rerun_args = self._dirty.pop(item.job.id, None)
+
+            if rerun_args is not None:
+                print(f"🔁 Rerunning {item.job.id} with newer inputs")
+                self._scheduler.add_job(
+                    func=item.job.func,
+                    args=rerun_args,
+                    id=item.job.id,
+                    executor=self.name,
+                    replace_existing=True
+                )
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def pending_entries(self) -> set:
+        with self._cond:
+            return {item.entry_id for item in self._pending.values()}
+
+    def positions(self) -> dict:
+        """entry_id -> jobs dispatched before its first pending job, in heap order."""
+        with self._cond:
+            items = sorted(self._pending.values(), key=lambda item: (item.rank, item.start, item.seq))
+        positions = {}
+        for ahead, item in enumerate(items):
+            positions.setdefault(item.entry_id, ahead)
+        return positions
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            items = list(self._pending.values())
+            busy = len(self._running)
+        by_class = Counter(PRIORITY_CLASSES[item.rank] for item in items)
+        return {
+            "workers": self.max_workers,
+            "busy": busy,
+            "queued": len(items),
+            "queued_by_class": {cls: by_class.get(cls, 0) for cls in PRIORITY_CLASSES},
+            "queued_clients": len({item.client for item in items}),
+            "oldest_wait_s": max((now - item.queued_at for item in items), default=0.0),
+            "wait_s": self._wait.snapshot(),
+        }
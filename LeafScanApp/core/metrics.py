@@ -0,0 +1,71 @@
+import bisect
+import threading
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Histogram:
+    """Fixed-bucket histogram, safe to observe from worker threads."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = {f"le_{b}": c for b, c in zip(self.buckets, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            return {
+                "count": self.count,
+                "sum": self.total,
+                "mean": (self.total / self.count) if self.count else 0.0,
+                "buckets": buckets,
+            }
+
+
+class Counter:
+    """Monotonic counter, safe to increment from worker threads."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+def counter(name: str) -> Counter:
+    """Get or create a named counter."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter()
+        return _registry[name]
+
+
+def histogram(name: str, buckets) -> Histogram:
+    """Get or create a named histogram."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(buckets)
+        return _registry[name]
+
+
+def get_metrics() -> dict:
+    with _registry_lock:
+        metrics = dict(_registry)
+    return {name: m.snapshot() for name, m in metrics.items()}
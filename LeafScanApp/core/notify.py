@@ -0,0 +1,118 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from config.inference import RESULT_MAX_WAITERS
+from core.metrics import counter
+from storage import get_meta_store, JOB_EVENTS_PREFIX
+
+RECONNECT_DELAY_S = 1.0
+
+
+class _Watch:
+    def __init__(self, lock):
+        self.cond = threading.Condition(lock)
+        self.seq = 0
+        self.waiters = 0
+
+
+class Changes:
+    """Handle returned by JobEvents.watch(); wait() returns once the job hash changed."""
+
+    def __init__(self, events, watch):
+        self._events = events
+        self._watch = watch
+        self._seen = watch.seq
+
+    def wait(self, timeout) -> bool:
+        """True if a change was published since the last wait (or the watch started)."""
+        with self._events._lock:
+            if self._watch.seq == self._seen:
+                self._watch.cond.wait(timeout)
+            changed = self._watch.seq != self._seen
+            self._seen = self._watch.seq
+            return changed
+
+
+class JobEvents:
+    """
+    Fans one Redis pub/sub connection out to every request waiting on a job.
+    A held request parks on a condition; it costs no Redis connection and no
+    polling, and only wakes when CacheMetaStore publishes a change to its entry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watches = {}      # entry_id -> _Watch
+        self._waiters = 0
+        self._thread = None
+
+    def _ensure_listener(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="job-events", daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = get_meta_store().r.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(JOB_EVENTS_PREFIX + "*")
+                # Changes made while disconnected are lost: have every waiter re-check
+                self._wake_all()
+                for message in pubsub.listen():
+                    self._wake(message["channel"][len(JOB_EVENTS_PREFIX):])
+            except Exception as e:
+                print(f"⚠️ Job events listener lost Redis: {e}")
+                time.sleep(RECONNECT_DELAY_S)
+
+    def _wake(self, entry_id):
+        with self._lock:
+            watch = self._watches.get(entry_id)
+            if watch:
+                watch.seq += 1
+                watch.cond.notify_all()
+
+    def _wake_all(self):
+        with self._lock:
+            for watch in self._watches.values():
+                watch.seq += 1
+                watch.cond.notify_all()
+
+    @contextmanager
+    def watch(self, entry_id):
+        """
+        Yields Changes for entry_id, or None when RESULT_MAX_WAITERS requests
+        are already held (the caller should answer right away).
+        Start watching before reading state, so no change slips in between.
+        """
+        with self._lock:
+            if self._waiters >= RESULT_MAX_WAITERS:
+                watch = None
+            else:
+                self._waiters += 1
+                watch = self._watches.get(entry_id)
+                if watch is None:
+                    watch = self._watches[entry_id] = _Watch(self._lock)
+                watch.waiters += 1
+                self._ensure_listener()
+
+        if watch is None:
+            counter("result_waiters_rejected").inc()
+            yield None
+            return
+
+        try:
+            yield Changes(self, watch)
+        finally:
+            with self._lock:
+                self._waiters -= 1
+                watch.waiters -= 1
+                if watch.waiters == 0:
+                    del self._watches[entry_id]
+
+    def waiting(self) -> int:
+        with self._lock:
+            return self._waiters
+
+
+job_events = JobEvents()
@@ -0,0 +1,77 @@
+from config.inference import RECOVERY_SCAN_COUNT
+from core.cache import get_cache
+from core.dependencies import UPSTREAM_DEPENDENCY_SCHEMA
+from core.lanes import prioritize
+from inference.all_schedulers import SCHEDULERS
+from storage import ARTIFACTS, schedule_upload, restore_upload_batch
+
+# Every flag recovery needs, read with one HMGET per entry
+_FIELDS = sorted(
+    set(SCHEDULERS)
+    | {dep for flag in SCHEDULERS for dep in UPSTREAM_DEPENDENCY_SCHEMA[flag]}
+    | {a.upload_flag for a in ARTIFACTS.values()}
+    | {a.output_flag or a.input_flag for a in ARTIFACTS.values()}
+    | {a.size_field for a in ARTIFACTS.values()}
+    | {a.checksum_field for a in ARTIFACTS.values()}
+)
+
+def _set(flags, field) -> bool:
+    return flags.get(field) not in (None, "0", "")
+
+def _on_disk(flags, artifact) -> bool:
+    # Every write records the artifact's size and checksum; a purge clears them
+    return _set(flags, artifact.size_field) and _set(flags, artifact.checksum_field)
+
+def recover_jobs() -> dict:
+    """
+    Rebuild jobs lost with a restart from the job hashes:
+      - out_* flags at 0 whose inputs are all present → inference job
+      - up_* flags at 0 whose artifact is on disk → upload job
+    Small artifacts that were waiting for a batch go back in the batch first.
+    Jobs still queued absorb the resubmission, so this is safe to rerun.
+    """
+    cache = get_cache()
+    r = cache.meta.r
+    counts = {"entries": 0, "inference": 0, "uploads": 0}
+    # Held artifacts keep their attempt counts; the scan below finds them already batched
+    counts["batched"] = restore_upload_batch()
+
+    keys = []
+    for key in r.scan_iter("job:*", count=RECOVERY_SCAN_COUNT):
+        keys.append(key)
+        if len(keys) >= RECOVERY_SCAN_COUNT:
+            _recover_keys(cache, keys, counts)
+            keys = []
+    if keys:
+        _recover_keys(cache, keys, counts)
+
+    print(f"♻️ Recovery: {counts['entries']} entries, resubmitted {counts['inference']} inference and {counts['uploads']} upload jobs")
+    return counts
+
+def _recover_keys(cache, keys, counts):
+    pipe = cache.meta.r.pipeline(transaction=False)
+    for key in keys:
+        pipe.hmget(key, _FIELDS)
+
+    for key, values in zip(keys, pipe.execute()):
+        entry_id = key.split(":", 1)[1]
+        flags = dict(zip(_FIELDS, values))
+        counts["entries"] += 1
+
+        for flag, schedule in SCHEDULERS.items():
+            if _set(flags, flag):
+                continue
+            if all(_set(flags, dep) for dep in UPSTREAM_DEPENDENCY_SCHEMA[flag]):
+                # Nobody is waiting on recovered work until they poll for it
+                prioritize(entry_id, "background")
+                schedule(entry_id, None)
+                counts["inference"] += 1
+
+        for step, artifact in ARTIFACTS.items():
+            if _set(flags, artifact.upload_flag):
+                continue
+            if not _set(flags, artifact.output_flag or artifact.input_flag):
+                continue
+            if _on_disk(flags, artifact):
+                schedule_upload(entry_id, step, cache.artifact_path(entry_id, step))
+                counts["uploads"] += 1
@@ -1,17 +1,274 @@
+import os
+import queue
+import threading
+import multiprocessing
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.redis import RedisJobStore
+from apscheduler.jobstores.base import ConflictingIdError
+
+from config.inference import LEAFSCAN_WORKERS, LEAFSCAN_MP_CONTEXT, JOB_QUEUE_BACKEND, INFERENCE_LANES, CANCEL_CHECK_INTERVAL_S
+from config.storage import UPLOAD_CONCURRENCY, UPLOAD_VIDEO_CONCURRENCY
+from core.lanes import LaneExecutor, get_lane, lane_depth, pending_entries
+
+def _jobstore(name):
+    """Queued jobs live in Redis so they survive a restart."""
+    if JOB_QUEUE_BACKEND == "memory":
+        return MemoryJobStore()
+    return RedisJobStore(
+        jobs_key=f"apscheduler:{name}:jobs",
+        run_times_key=f"apscheduler:{name}:run_times",
+        host=os.getenv("REDIS_HOST", "127.0.0.1"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+    )
+
+def queued_count(jobstore) -> int:
+    """Jobs waiting in a store, counted without unpickling them."""
+    if isinstance(jobstore, RedisJobStore):
+        return jobstore.redis.zcard(jobstore.run_times_key)
+    return len(jobstore.get_all_jobs())
+
+def queued_job_ids(jobstore) -> list:
+    """Ids of the jobs waiting in a store, read without unpickling them."""
+    if isinstance(jobstore, RedisJobStore):
+        return [job_id.decode() for job_id in jobstore.redis.hkeys(jobstore.jobs_key)]
+    return [job.id for job in jobstore.get_all_jobs()]
+
+# (prefix, suffixes) of job ids built as prefix + entry_id + suffix
+_job_id_formats = []
+
+def register_job_ids(prefix, suffixes=("",)):
+    """Declare a job id format, so active_entries can read entries from ids alone."""
+    _job_id_formats.append((prefix, tuple(suffixes)))
+
+def entry_of_job(job_id):
+    """Entry a job id was built for, or None for jobs not tied to one entry."""
+    for prefix, suffixes in _job_id_formats:
+        if not job_id.startswith(prefix):
+            continue
+        for suffix in suffixes:
+            if job_id.endswith(suffix) and len(job_id) > len(prefix) + len(suffix):
+                return job_id[len(prefix):len(job_id) - len(suffix)]
+    return None
+
+def jobs_ahead(lane) -> int:
+    """Inference jobs ahead of one just added to lane: not yet due, or waiting for a worker."""
+    return max(queued_count(inference_jobstore) + lane_depth(lane) - 1, 0)
 
+inference_jobstore = _jobstore("inference")
 inference_scheduler = BackgroundScheduler(
-    jobstores={"default": MemoryJobStore()},
-    executors={"default": ThreadPoolExecutor(5)},
-    job_defaults={"coalesce": False, "max_instances": 1},
+    jobstores={"default": inference_jobstore},
+    # One lane per stage; simulated jobs wait on the LeafScan process pool,
+    # or run LeafScan in-thread on their own scratch slot when it is disabled
+    executors={lane: LaneExecutor(lane, workers) for lane, workers in INFERENCE_LANES.items()},
+    # Jobs restored after a restart still run, however late
+    job_defaults={"coalesce": False, "max_instances": 1, "misfire_grace_time": None},
 )
-inference_scheduler.start()
 
+def submit_inference(func, entry_id, state, lane, job_id):
+    """
+    Queue job_id in lane at most once:
+      - already waiting (jobstore or lane) → that run is reused
+      - running → exactly one follow-up run once it finishes, with the newest inputs
+    Returns the job handle and the number of jobs ahead of it.
+    """
+    args = [entry_id, state]
+    while True:
+        claimed = get_lane(lane).claim(job_id, args)
+        if claimed:
+            return claimed
+        try:
+            job = inference_scheduler.add_job(
+                func=func,
+                args=args,
+                id=job_id,
+                executor=lane,
+                replace_existing=False
+            )
+            return job, jobs_ahead(lane)
+        except ConflictingIdError:
+            job = inference_scheduler.get_job(job_id)
+            if job:
+                if state is not None:
+                    job = job.modify(args=args)
+                return job, max(queued_count(inference_jobstore) - 1, 0)
+        # Handed from the jobstore to the lane in between; claim it there
+
+upload_jobstore = _jobstore("upload")
 upload_scheduler = BackgroundScheduler(
+    jobstores={"default": upload_jobstore},
+    # Each upload job is one attempt; retries wait in the jobstore, not in a worker.
+    # Videos get their own workers, so results never queue behind them
+    executors={
+        "default": ThreadPoolExecutor(UPLOAD_CONCURRENCY),
+        "video": ThreadPoolExecutor(UPLOAD_VIDEO_CONCURRENCY),
+    },
+    job_defaults={"coalesce": False, "max_instances": 1, "misfire_grace_time": None},
+)
+
+# Eviction, expiry sweeps and reconciliation, one at a time off the request path
+maintenance_scheduler = BackgroundScheduler(
     jobstores={"default": MemoryJobStore()},
-    executors={"default": ThreadPoolExecutor(8)},
-    job_defaults={"coalesce": False, "max_instances": 1},
+    executors={"default": ThreadPoolExecutor(1)},
+    job_defaults={"coalesce": True, "max_instances": 1},
 )
-upload_scheduler.start()
+
+def start_schedulers():
+    """
+    Warm the LeafScan workers and start running queued jobs. Called by the
+    server only: LeafScan worker processes import this module too, and must
+    never pick up jobs.
+    """
+    start_leafscan_workers()
+    for scheduler in (inference_scheduler, upload_scheduler, maintenance_scheduler):
+        if not scheduler.running:
+            scheduler.start()
+
+# Entries with a job executing right now (queued ones are in the jobstores)
+_running = Counter()
+_running_lock = threading.Lock()
+
+# Callables returning entries with work held outside the jobstores
+_active_sources = []
+
+def register_active_source(source):
+    """Count source()'s entries as active, so eviction leaves them alone."""
+    _active_sources.append(source)
+
+@contextmanager
+def track_running(entry_id):
+    """Mark entry_id as busy while a job works on it."""
+    with _running_lock:
+        _running[entry_id] += 1
+    try:
+        yield
+    finally:
+        with _running_lock:
+            _running[entry_id] -= 1
+            if _running[entry_id] <= 0:
+                del _running[entry_id]
+
+def active_entries() -> set:
+    """Entries with a queued or running job; eviction leaves these alone."""
+    active = set()
+    for jobstore in (inference_jobstore, upload_jobstore):
+        active.update(entry_of_job(job_id) for job_id in queued_job_ids(jobstore))
+    active.discard(None)
+    active.update(pending_entries())
+    for source in _active_sources:
+        active.update(source())
+    with _running_lock:
+        active.update(_running)
+    return active
+
+def _leafscan_worker_main(conn):
+    """LeafScan worker process: warm one slot, then run (func, args) requests until the pipe closes."""
+    from models.leafscan_model import init_leafscan_worker
+    init_leafscan_worker()
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+class LeafScanWorker:
+    """One LeafScan process, owned by one run at a time; killed if that run is cancelled."""
+
+    def __init__(self):
+        ctx = multiprocessing.get_context(LEAFSCAN_MP_CONTEXT)
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_leafscan_worker_main, args=(child,), name="leafscan-worker", daemon=True)
+        self.process.start()
+        child.close()
+
+    def run(self, func, args, checkpoint=None):
+        """Returns (ok, result or exception); checkpoint is polled while the worker is busy."""
+        try:
+            self.conn.send((func, args))
+            while not self.conn.poll(CANCEL_CHECK_INTERVAL_S):
+                if not self.process.is_alive():
+                    raise EOFError
+                if checkpoint:
+                    checkpoint()
+            return self.conn.recv()
+        except (EOFError, ConnectionError):
+            self.process.join(timeout=1)
+            raise BrokenProcessPool(f"LeafScan worker {self.process.pid} exited with {self.process.exitcode}")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+# Warm workers waiting for a run; at most LEAFSCAN_WORKERS are alive at once
+_idle_leafscan_workers = queue.SimpleQueue()
+_live_leafscan_workers = 0
+_leafscan_workers_lock = threading.Lock()
+
+def _spawn_leafscan_worker():
+    """Warm one more worker off the request path, unless LEAFSCAN_WORKERS are already alive."""
+    global _live_leafscan_workers
+    with _leafscan_workers_lock:
+        if _live_leafscan_workers >= LEAFSCAN_WORKERS:
+            return
+        _live_leafscan_workers += 1
+
+    def spawn():
+        try:
+            worker = LeafScanWorker()
+        except Exception as e:
+            _retire_leafscan_worker()
+            # Wake a run waiting for this worker, so it fails instead of hanging
+            _idle_leafscan_workers.put(e)
+            return
+        _idle_leafscan_workers.put(worker)
+
+    threading.Thread(target=spawn, name="leafscan-worker-spawn", daemon=True).start()
+
+def _retire_leafscan_worker():
+    global _live_leafscan_workers
+    with _leafscan_workers_lock:
+        _live_leafscan_workers -= 1
+
+def start_leafscan_workers():
+    """Warm the whole pool at startup, so the first runs don't pay for it."""
+    for _ in range(LEAFSCAN_WORKERS):
+        _spawn_leafscan_worker()
+
+def run_in_leafscan_pool(func, *args, checkpoint=None):
+    """
+    Run func in a LeafScan worker process and wait for its result.
+    checkpoint is polled from this thread meanwhile; when it raises
+    (core.versions.Superseded), the worker is killed mid-scan and replaced.
+    """
+    try:
+        worker = _idle_leafscan_workers.get_nowait()
+    except queue.Empty:
+        # Every live worker is busy or still warming: wait for one
+        _spawn_leafscan_worker()
+        worker = _idle_leafscan_workers.get()
+    if isinstance(worker, Exception):
+        raise BrokenProcessPool(f"LeafScan worker failed to start: {worker}")
+
+    try:
+        ok, result = worker.run(func, args, checkpoint)
+    except BaseException:
+        # Cancelled, or the worker died (OOM, segfault in OpenCV)
+        worker.stop()
+        _retire_leafscan_worker()
+        _spawn_leafscan_worker()
+        raise
+
+    _idle_leafscan_workers.put(worker)
+    if not ok:
+        raise result
+    return result
@@ -0,0 +1,33 @@
+import time
+
+from config.inference import CANCEL_CHECK_INTERVAL_S
+from storage import get_meta_store
+
+
+class Superseded(Exception):
+    """A run's inputs changed while it was working; its result is dropped."""
+
+
+class InputVersion:
+    """
+    Version of a step's inputs that a run started from. Picklable, so
+    LeafScan worker processes can poll it between frames.
+    """
+
+    def __init__(self, entry_id: str, field: str, version: int):
+        self.entry_id = entry_id
+        self.field = field
+        self.version = version
+        self._checked_at = 0.0
+
+    def superseded(self) -> bool:
+        return get_meta_store().get_version(self.entry_id, self.field) != self.version
+
+    def checkpoint(self):
+        """Raise Superseded once the inputs moved on; Redis is read at most every CANCEL_CHECK_INTERVAL_S."""
+        now = time.monotonic()
+        if now - self._checked_at < CANCEL_CHECK_INTERVAL_S:
+            return
+        self._checked_at = now
+        if self.superseded():
+            raise Superseded(f"{self.entry_id}: {self.field} moved past {self.version}")
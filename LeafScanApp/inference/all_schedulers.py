@@ -2,6 +2,9 @@ from storage import JobFields
 from .defoliation_schedule_inference import schedule_defoliation_inference
 from .original_schedule_inference import schedule_original_inference
 from .simulated_schedule_inference import schedule_simulated_inference
+from .defoliation_inference import defoliation_inference
+from .original_inference import original_inference
+from .simulated_inference import simulated_inference
 
 from core.dependencies import dependencies_ready
 
@@ -9,4 +12,11 @@ SCHEDULERS = {
     JobFields.OUT_ORIGINAL: schedule_original_inference,
     JobFields.OUT_SIMULATED: schedule_simulated_inference,
     JobFields.OUT_DEFOLIATION: schedule_defoliation_inference
+}
+
+# The jobs themselves, for stages core.dag runs inline
+RUNNERS = {
+    JobFields.OUT_ORIGINAL: original_inference,
+    JobFields.OUT_SIMULATED: simulated_inference,
+    JobFields.OUT_DEFOLIATION: defoliation_inference
 }
\ No newline at end of file
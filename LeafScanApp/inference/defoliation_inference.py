@@ -1,21 +1,20 @@
 from core.cache import get_cache
+from core.dag import advance
 from core.dependencies import dependencies_ready
+from core.scheduler import track_running
 from storage import get_meta_store, ARTIFACTS, JobFields, JobTypes
 
 def defoliation_inference(entry_id, state=None):
     """Calculates defoliation % based on original and simulated areas."""
-    
+    # One meta store flush per run; follow-up jobs are scheduled after it
+    with track_running(entry_id), get_cache().meta.batch():
+        return _defoliation_inference(entry_id, state)
+
+def _defoliation_inference(entry_id, state=None):
     cache = get_cache()
     if not state:
         state = cache.load(entry_id, JobTypes.DEFOLIATION)
     
-    output_flag = bool(
-        cache.meta.get_field(
-            entry_id, 
-            ARTIFACTS[JobTypes.DEFOLIATION].output_flag
-        )
-    )
-
     try:
         ready, missing, rerunnable = dependencies_ready(
             entry_id,
@@ -25,13 +24,16 @@ def defoliation_inference(entry_id, state=None):
         # 1️⃣ Missing inputs → do nothing
         if not ready or state["status"] == "waiting":
             state["status"] = "waiting"
-            cache.save(entry_id, JobTypes.ORIGINAL_AREA, state)
+            cache.save(entry_id, JobTypes.DEFOLIATION, state)
             print("⏸ Defoliation: waiting on dependencies")
             return 
        
         # 2️⃣ Artifact says completed AND flag agrees → trust and return
         if state["status"] == "completed":
             pred_defoliation = state["results"][JobTypes.DEFOLIATION]
+            # An upstream rerun produced the same areas: the result still holds
+            cache.meta.update_field(entry_id, ARTIFACTS[JobTypes.DEFOLIATION].output_flag)
+            cache.meta.update_field(entry_id, JobFields.RESULT_DEFOLIATION, pred_defoliation)
             print(f"✅ Defoliation (cached): {pred_defoliation:.2f}%")
             return pred_defoliation
             
@@ -62,9 +64,12 @@ def defoliation_inference(entry_id, state=None):
         print()
 
         print(f"✅ Defoliation (computed): {pred_defoliation:.2f}%")
+        cache.meta.defer(advance, entry_id, ARTIFACTS[JobTypes.DEFOLIATION].output_flag)
         return pred_defoliation
 
     except Exception as e:
         state["status"] = "failed"
         cache.save(entry_id, JobTypes.DEFOLIATION, state)
+        # Let the next poll or input dispatch it again
+        cache.meta.release_stage(entry_id, ARTIFACTS[JobTypes.DEFOLIATION].output_flag)
         raise RuntimeError(f"Defoliation inference failed: {e}")
\ No newline at end of file
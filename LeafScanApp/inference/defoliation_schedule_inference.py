@@ -1,13 +1,16 @@
-from core.scheduler import inference_scheduler
+from core.scheduler import submit_inference, register_job_ids
+from storage import JobTypes
 from .defoliation_inference import defoliation_inference
 
+register_job_ids("defoliation_")
+
 def schedule_defoliation_inference(entry_id, state=None):
-    job = inference_scheduler.add_job(
-        func=defoliation_inference,
-        args=[entry_id, state],
-        id=f"defoliation_{entry_id}",
-        replace_existing=False
+    job, queue_size = submit_inference(
+        defoliation_inference,
+        entry_id,
+        state,
+        JobTypes.DEFOLIATION,
+        f"defoliation_{entry_id}"
     )
-    queue_size = len(inference_scheduler.get_jobs()) - 1
     print(f"Queued Defoliation Job -> {job.id}")
     return job, queue_size
@@ -1,24 +1,22 @@
 from core.cache import get_cache
+from core.dag import advance
 from core.dependencies import dependencies_ready
+from core.scheduler import track_running
 from models.original_area_model import run_model
 from storage import ARTIFACTS, JobFields, JobTypes 
 
-from .defoliation_schedule_inference import schedule_defoliation_inference
 
 def original_inference(entry_id, state=None):
     """Runs ML model to infer original area and update cache."""
+    # One meta store flush per run; follow-up jobs are scheduled after it
+    with track_running(entry_id), get_cache().meta.batch():
+        return _original_inference(entry_id, state)
 
+def _original_inference(entry_id, state=None):
     cache = get_cache()
     if not state:
         state = cache.load(entry_id, JobTypes.ORIGINAL_AREA)
     
-    output_flag = bool(
-        cache.meta.get_field(
-            entry_id, 
-            ARTIFACTS[JobTypes.ORIGINAL_AREA].output_flag
-        )
-    )
-
     try:
         ready, missing, rerunnable = dependencies_ready(
             entry_id,
@@ -48,6 +46,7 @@ def original_inference(entry_id, state=None):
         if leaf_number is None or leaf_widths is None:
             raise ValueError("Missing original area params")
 
+        # Identical params across entries are served by the model's prediction memo
         pred_orig_area = run_model(leaf_number, leaf_widths)
 
         state["results"][JobTypes.ORIGINAL_AREA] = pred_orig_area
@@ -64,12 +63,13 @@ def original_inference(entry_id, state=None):
         print()
     
         print(f"✅ Original Area (computed): {pred_orig_area:.2f}")
-        inf_job, inf_queue_size = schedule_defoliation_inference(entry_id, None)
-        print(inf_job.id)
+        cache.meta.defer(advance, entry_id, ARTIFACTS[JobTypes.ORIGINAL_AREA].output_flag)
 
         return pred_orig_area
 
     except Exception as e:
         state["status"] = "failed"
         cache.save(entry_id, JobTypes.ORIGINAL_AREA, state)
+        # Let the next poll or input dispatch it again
+        cache.meta.release_stage(entry_id, ARTIFACTS[JobTypes.ORIGINAL_AREA].output_flag)
         raise RuntimeError(f"Original inference failed: {e}")
@@ -1,13 +1,16 @@
-from core.scheduler import inference_scheduler
+from core.scheduler import submit_inference, register_job_ids
+from storage import JobTypes
 from .original_inference import original_inference
 
+register_job_ids("original_")
+
 def schedule_original_inference(entry_id, state=None):
-    job = inference_scheduler.add_job(
-        func=original_inference,
-        args=[entry_id, state],
-        id=f"original_{entry_id}",
-        replace_existing=False
+    job, queue_size = submit_inference(
+        original_inference,
+        entry_id,
+        state,
+        JobTypes.ORIGINAL_AREA,
+        f"original_{entry_id}"
     )
-    queue_size = len(inference_scheduler.get_jobs()) - 1
     print(f"Queued Original Area Job -> {job.id}")
-    return job, queue_size
\ No newline at end of file
+    return job, queue_size
@@ -1,29 +1,24 @@
-import os
-import shutil
-import tempfile
-
 from core.cache import get_cache
+from core.dag import advance
 from core.dependencies import dependencies_ready
-from core.paths import VIDEO_DIR, OUT_DIR, SLICES_DIR
+from config.inference import LEAFSCAN_WORKERS
+from core.paths import VIDEO_DIR, OUT_DIR
+from core.scheduler import run_in_leafscan_pool, track_running
+from core.versions import Superseded
 from models.leafscan_model import run_leafscan
 from storage import ARTIFACTS, JobFields, JobTypes
 
-from .defoliation_schedule_inference import schedule_defoliation_inference
 
 def simulated_inference(entry_id, state=None):
     """Orchestrates LeafScan inference and updates cache."""
-    
+    # One meta store flush per run; follow-up jobs are scheduled after it
+    with track_running(entry_id), get_cache().meta.batch():
+        return _simulated_inference(entry_id, state)
+
+def _simulated_inference(entry_id, state=None):
     cache = get_cache()
-    if not state:
-        state = cache.load(entry_id, JobTypes.SIMULATED_AREA)
+    version, state = cache.start_run(entry_id, JobTypes.SIMULATED_AREA, state)
     
-    output_flag = bool(
-        cache.meta.get_field(
-            entry_id, 
-            ARTIFACTS[JobTypes.SIMULATED_AREA].output_flag
-        )
-    )
-
     try:
         ready, missing, rerunnable = dependencies_ready(
             entry_id,
@@ -33,7 +28,9 @@ def simulated_inference(entry_id, state=None):
         # 1️⃣ Missing inputs → do nothing
         if not ready or state["status"] == "waiting":
             state["status"] = "waiting"
-            cache.save(entry_id, JobTypes.SIMULATED_AREA, state)
+            with cache.commit_run(version) as current:
+                if current:
+                    cache.save(entry_id, JobTypes.SIMULATED_AREA, state)
             print("⏸ Simulated Area: waiting on dependencies")
             return 
        
@@ -51,28 +48,43 @@ def simulated_inference(entry_id, state=None):
         if length is None:
             raise ValueError("Missing simulated area params")
 
-        with cache.load_video_stream(entry_id) as stream:
-            with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
-                shutil.copyfileobj(stream, tmp)
-                tmp_path = tmp.name
-        try:
-            video_output_path = OUT_DIR / entry_id
-            pred_sim_area = run_leafscan(entry_id, tmp_path, video_output_path, length)
-        except:
-            self.cache.meta.update_field(entry_id, JobFields.IN_VIDEO, 0)
-            raise ValueError("Error opening LeafScan video")
-        finally:
-            # Ensure temp file is cleaned up even if run_leafscan fails
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
+        input_hash, pred_sim_area = cache.cached_result(entry_id, JobTypes.SIMULATED_AREA, params)
+        if pred_sim_area is not None:
+            print(f"♻️ Simulated Area reused for identical video: {pred_sim_area:.2f}")
+        else:
+            try:
+                video_output_path = OUT_DIR / entry_id
+                with cache.video_local_path(entry_id) as video_path:
+                    if LEAFSCAN_WORKERS > 0:
+                        # Polled from here; a superseded run's worker is killed mid-scan
+                        pred_sim_area = run_in_leafscan_pool(
+                            run_leafscan, entry_id, video_path, video_output_path, length,
+                            checkpoint=version.checkpoint
+                        )
+                    else:
+                        pred_sim_area = run_leafscan(entry_id, video_path, video_output_path, length, version.checkpoint)
+            except Superseded:
+                print(f"⏹ Simulated Area: inputs changed, dropped the run for {entry_id}")
+                return
+            except OSError:
+                # Missing or unreadable video: ask for it again
+                cache.meta.update_field(entry_id, JobFields.IN_VIDEO, 0)
+                raise ValueError("Error opening LeafScan video")
+            # Keyed by the inputs it was computed from, so valid even if superseded
+            cache.store_result(JobTypes.SIMULATED_AREA, input_hash, pred_sim_area)
 
-        state["results"][JobTypes.SIMULATED_AREA] = pred_sim_area
-        state["status"] = "completed"
-        
-        cache.save(entry_id, JobTypes.SIMULATED_AREA, state)
-        cache.update(entry_id, JobTypes.DEFOLIATION, {JobTypes.SIMULATED_AREA: pred_sim_area})
-        
-        cache.meta.update_field(entry_id, ARTIFACTS[JobTypes.SIMULATED_AREA].output_flag)
+        with cache.commit_run(version) as current:
+            if not current:
+                print(f"⏹ Simulated Area: inputs changed, dropped the result for {entry_id}")
+                return
+
+            state["results"][JobTypes.SIMULATED_AREA] = pred_sim_area
+            state["status"] = "completed"
+
+            cache.save(entry_id, JobTypes.SIMULATED_AREA, state)
+            cache.update(entry_id, JobTypes.DEFOLIATION, {JobTypes.SIMULATED_AREA: pred_sim_area})
+
+            cache.meta.update_field(entry_id, ARTIFACTS[JobTypes.SIMULATED_AREA].output_flag)
 
         print(f">>>> Simulated {entry_id} >>>>")
         print(cache.meta.get_entry(entry_id))
@@ -80,12 +92,15 @@ def simulated_inference(entry_id, state=None):
         print()
     
         print(f"✅ Simulated area (computed): {pred_sim_area:.2f}")
-        job, queue_size = schedule_defoliation_inference(entry_id, None)
-        print(job.id)
+        cache.meta.defer(advance, entry_id, ARTIFACTS[JobTypes.SIMULATED_AREA].output_flag)
 
         return pred_sim_area
 
     except Exception as e:
         state["status"] = "failed"
-        cache.save(entry_id, JobTypes.SIMULATED_AREA, state)
+        with cache.commit_run(version) as current:
+            if current:
+                cache.save(entry_id, JobTypes.SIMULATED_AREA, state)
+                # Let the next poll or input dispatch it again
+                cache.meta.release_stage(entry_id, ARTIFACTS[JobTypes.SIMULATED_AREA].output_flag)
         raise RuntimeError(f"Simulated inference failed: {e}")
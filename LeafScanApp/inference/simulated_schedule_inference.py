@@ -1,14 +1,16 @@
-from core.scheduler import inference_scheduler
+from core.scheduler import submit_inference, register_job_ids
+from storage import JobTypes
 from .simulated_inference import simulated_inference
 
+register_job_ids("simulated_")
+
 def schedule_simulated_inference(entry_id, state=None):
-    job = inference_scheduler.add_job(
-        func=simulated_inference,
-        args=[entry_id, state],
-        id=f"simulated_{entry_id}",
-        replace_existing=False
+    job, queue_size = submit_inference(
+        simulated_inference,
+        entry_id,
+        state,
+        JobTypes.SIMULATED_AREA,
+        f"simulated_{entry_id}"
     )
-    queue_size = len(inference_scheduler.get_jobs()) - 1
     print(f"Queued Simulated Area Job -> {job.id}")
     return job, queue_size
-
@@ -1,49 +1,167 @@
-import sys
+import os
+import cv2
+import queue
 import shutil
+import threading
+import itertools
 import numpy as np
+from contextlib import contextmanager
+from config.inference import FRAME_STRIDE, FRAME_KEYFRAMES_ONLY, FRAME_BUFFER_SIZE
 from core.paths import SLICES_DIR
 
 from LeafScan import LeafScan
 from LeafScan.Configs import ViewExtractorConfig, LeafExtractorConfig
 from LeafScan.Utils import stitch_images_vertically
 
-leafscan_instance = None
+# Idle (instance, slices folder) slots; a slot is owned by one job at a time
+_idle_slots = queue.SimpleQueue()
+_slot_ids = itertools.count()
 
-def init_leafscan(view_config=None, separator_config=None):
-    """Initialize and store a LeafScan instance."""
+# Only reported by the FFmpeg backend
+_KEYFRAME_PROP = getattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME", None)
+
+def init_leafscan(view_config=None, separator_config=None, output_folder=SLICES_DIR):
+    """Initialize a LeafScan instance writing its slices to output_folder."""
     if not view_config:
         view_config = ViewExtractorConfig()
         view_config.tool_bounds = (np.array([0, 138, 115]), np.array([255, 255, 255]))
 
-    global leafscan_instance
-    leafscan_instance = LeafScan(
+    return LeafScan(
         view_config=view_config,
         leaf_config=separator_config,
-        output_folder=SLICES_DIR,
+        output_folder=output_folder,
         display=False,
         deep_display=False
     )
-    return leafscan_instance
 
 
-def run_leafscan(video_name, video_path, output_path, length):
-    """Runs the LeafScan instance on a video and stitches the result."""
-    global leafscan_instance
-    if leafscan_instance is None:
-        leafscan_instance = init_leafscan()
-        
+def _new_slot():
+    folder = SLICES_DIR / f"slot_{os.getpid()}_{next(_slot_ids)}"
+    return init_leafscan(output_folder=folder), folder
+
+
+def _reset_dir(path):
+    if path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+
+@contextmanager
+def leafscan_slot():
+    """Check out a warm LeafScan instance and the scratch folder only it writes to."""
+    try:
+        slot = _idle_slots.get_nowait()
+    except queue.Empty:
+        slot = _new_slot()
+
+    instance, folder = slot
+    _reset_dir(folder)
+    try:
+        yield instance, folder
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        _idle_slots.put(slot)
+
+
+def init_leafscan_worker():
+    """Worker process start-up: warm one LeafScan slot for this worker."""
+    _idle_slots.put(_new_slot())
+    print(f"✅ LeafScan worker {os.getpid()} ready")
+
+
+def sample_video(video_path, sampled_path, stride=FRAME_STRIDE, keyframes_only=FRAME_KEYFRAMES_ONLY,
+                 buffer_size=FRAME_BUFFER_SIZE):
+    """
+    Write every stride-th frame of video_path (or only its keyframes) to
+    sampled_path. A decoder thread feeds the encoder through a bounded
+    buffer, so at most buffer_size frames are held at once; dropped frames
+    are only grabbed, never decoded to pixels. Returns the frames written.
+    """
+    keyframes_only = keyframes_only and _KEYFRAME_PROP is not None
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    # Keep the sampled video as long as the original
+    out_fps = fps if keyframes_only else fps / stride
+    writer = cv2.VideoWriter(str(sampled_path), cv2.VideoWriter_fourcc(*"mp4v"), out_fps, size)
+    frames = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+    errors = []
+
+    def decode():
+        try:
+            for index in itertools.count():
+                if stopped.is_set() or not cap.grab():
+                    break
+                keep = cap.get(_KEYFRAME_PROP) if keyframes_only else index % stride == 0
+                if not keep:
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                frames.put(frame)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            frames.put(None)
+
+    decoder = threading.Thread(target=decode, name="frame-decoder", daemon=True)
+    decoder.start()
+    written = 0
+    try:
+        while (frame := frames.get()) is not None:
+            writer.write(frame)
+            written += 1
+    finally:
+        stopped.set()
+        # Unblock a decoder waiting on a full buffer
+        while decoder.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        cap.release()
+        writer.release()
+
+    if errors:
+        raise errors[0]
+    return written
+
+
+def run_leafscan(video_name, video_path, output_path, length, checkpoint=None):
+    """
+    Runs a LeafScan instance on a video and stitches the result.
+    checkpoint raises (core.versions.Superseded) once the run's inputs changed;
+    in a worker process the parent polls it instead (run_in_leafscan_pool).
+    """
     stacked_slices_path = output_path.with_suffix(".jpg")
 
-    if SLICES_DIR.exists():
-        shutil.rmtree(SLICES_DIR)
-    SLICES_DIR.mkdir(parents=True, exist_ok=True)
+    with leafscan_slot() as (instance, folder):
+        print(f"▶️ Running LeafScan on: {video_name}")
+        if checkpoint:
+            checkpoint()
 
-    print(f"▶️ Running LeafScan on: {video_name}")
-    pred_simulated_area = leafscan_instance.scanVideo(
-        remaining_leaf_length=length,
-        video_path=str(video_path),
-        #output_path=str(output_path)
-    )
+        # Beside the slices folder, so the stitch below never picks it up
+        sampled_path = folder.with_name(f"{folder.name}_sampled.mp4")
+        try:
+            if FRAME_STRIDE > 1 or FRAME_KEYFRAMES_ONLY:
+                kept = sample_video(video_path, sampled_path)
+                print(f"🎞️ Sampled {kept} frames of {video_name} for LeafScan")
+                if checkpoint:
+                    checkpoint()
+                video_path = sampled_path
+
+            pred_simulated_area = instance.scanVideo(
+                remaining_leaf_length=length,
+                video_path=str(video_path),
+                #output_path=str(output_path)
+            )
+        finally:
+            sampled_path.unlink(missing_ok=True)
+
+        stitch_images_vertically(folder, stacked_slices_path)
 
-    stitch_images_vertically(SLICES_DIR, stacked_slices_path)
     return pred_simulated_area
@@ -1,28 +1,243 @@
+import time
+import json
+import queue
 import joblib
+import hashlib
+import threading
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import Future
+from redis import RedisError
 from LeafScan.Models import load_model
 
+from config.inference import (
+    ORIGINAL_BATCH_WINDOW_S, ORIGINAL_BATCH_MAX_ROWS,
+    ORIGINAL_MEMO_SIZE, ORIGINAL_MEMO_WIDTH_STEP, ORIGINAL_MEMO_REDIS, ORIGINAL_MEMO_TTL_S
+)
+from core.metrics import counter, histogram
+from storage.CacheMetaStore import get_redis
+
 model_instance = None
+model_fingerprint = None
+width_slots = None
+leaf_slot = None
+n_features = 0
+feature_columns = None   # training frame columns, if the model was fitted with names
+
+batch_size_hist = histogram("original_batch_size", [1, 2, 4, 8, 16, 32, 64, 128])
+batch_latency_hist = histogram("original_batch_latency_s", [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0])
+
+memo_hits = counter("original_memo_hits")
+memo_redis_hits = counter("original_memo_redis_hits")
+memo_misses = counter("original_memo_misses")
 
 def init_model(model_name=None):
     """Load and cache the trained model."""
     if not model_name:
         model_name = "leaf_model_gb.pkl"
-    global model_instance
+    global model_instance, model_fingerprint
     model_instance = load_model(model_name)
+    _init_feature_layout(model_instance)
+
+    # Memoized predictions belong to the model that made them
+    fingerprint = joblib.hash(model_instance)
+    if fingerprint != model_fingerprint:
+        prediction_memo.clear()
+    model_fingerprint = fingerprint
+
     print("✅ Model loaded successfully")
     return model_instance
 
 
+def _init_feature_layout(model):
+    """Fix the Width_i / Leaf_Number column positions used to build feature rows."""
+    global width_slots, leaf_slot, n_features, feature_columns
+
+    columns = getattr(model, "feature_names_in_", None)
+    feature_columns = None if columns is None else list(columns)
+    if columns is None:
+        # Fitted without names: same order the training frame used
+        n_widths = int(model.n_features_in_) - 1
+        columns = [f"Width_{i}" for i in range(n_widths)] + ["Leaf_Number"]
+    columns = list(columns)
+
+    width_columns = sorted(
+        (c for c in columns if c.startswith("Width_")),
+        key=lambda c: int(c.split("_", 1)[1])
+    )
+    width_slots = np.array([columns.index(c) for c in width_columns], dtype=np.intp)
+    leaf_slot = columns.index("Leaf_Number")
+    n_features = len(columns)
+
+
+def _feature_row(leaf_number, leaf_widths):
+    widths = np.asarray(leaf_widths, dtype=np.float64)
+    if widths.shape != width_slots.shape:
+        raise ValueError(f"Expected {len(width_slots)} leaf widths, got {widths.size}")
+
+    row = np.empty(n_features, dtype=np.float64)
+    row[width_slots] = widths
+    row[leaf_slot] = float(leaf_number)
+    return row
+
+
+def _predict(rows):
+    """Predict a matrix of feature rows, named like the training frame when it had names."""
+    if feature_columns is not None:
+        rows = pd.DataFrame(rows, columns=feature_columns)
+    return model_instance.predict(rows)
+
+
+class OriginalAreaBatcher:
+    """
+    Collects pending original area rows for a short window (or up to max_rows)
+    and runs them through the model as one predict call.
+    """
+
+    def __init__(self, window_s: float, max_rows: int):
+        self.window_s = window_s
+        self.max_rows = max_rows
+        self._pending = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, row) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._pending.put((row, future, time.perf_counter()))
+        return future
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="original-batcher", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.perf_counter() + self.window_s
+
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            predictions = _predict(np.vstack([row for row, _, _ in batch]))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        done = time.perf_counter()
+        batch_size_hist.observe(len(batch))
+        for (_, future, submitted), prediction in zip(batch, predictions):
+            batch_latency_hist.observe(done - submitted)
+            future.set_result(float(prediction))
+
+
+class PredictionMemo:
+    """
+    Bounded LRU of predictions keyed on (model, leaf number, widths),
+    optionally backed by Redis so compute nodes share each other's hits.
+    """
+
+    def __init__(self, max_size: int, use_redis: bool = False, ttl_s: int | None = None):
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _redis_key(self, key) -> str:
+        fingerprint, leaf_number, widths = key
+        digest = hashlib.sha1(json.dumps([leaf_number, widths]).encode("utf-8")).hexdigest()
+        return f"memo:original:{fingerprint}:{digest}"
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                memo_hits.inc()
+                return self._entries[key]
+
+        if self.use_redis:
+            try:
+                val = get_redis().get(self._redis_key(key))
+            except RedisError:
+                val = None
+            if val is not None:
+                memo_redis_hits.inc()
+                self._remember(key, float(val))
+                return float(val)
+
+        memo_misses.inc()
+        return None
+
+    def put(self, key, value: float):
+        self._remember(key, value)
+        if self.use_redis:
+            try:
+                get_redis().set(self._redis_key(key), value, ex=self.ttl_s)
+            except RedisError:
+                pass
+
+    def _remember(self, key, value: float):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        # Redis entries are namespaced by model fingerprint and simply age out
+        with self._lock:
+            self._entries.clear()
+
+
+def quantize_widths(leaf_widths):
+    widths = [float(w) for w in leaf_widths]
+    if ORIGINAL_MEMO_WIDTH_STEP > 0:
+        step = ORIGINAL_MEMO_WIDTH_STEP
+        widths = [round(round(w / step) * step, 10) for w in widths]
+    return widths
+
+
+batcher = OriginalAreaBatcher(ORIGINAL_BATCH_WINDOW_S, ORIGINAL_BATCH_MAX_ROWS)
+prediction_memo = PredictionMemo(ORIGINAL_MEMO_SIZE, ORIGINAL_MEMO_REDIS, ORIGINAL_MEMO_TTL_S)
+
 def run_model(leaf_number, leaf_widths):
     """Predict original area using the ML model."""
     global model_instance
     if model_instance is None:
         model_instance = init_model()
 
-    param_dict = {f"Width_{i}": w for i, w in enumerate(leaf_widths)}
-    param_dict["Leaf_Number"] = leaf_number
-    model_params = pd.DataFrame([param_dict])
-    
-    prediction = model_instance.predict(model_params)[0]
-    return float(prediction)
+    # Quantized widths are both the memo key and what the model sees,
+    # so a memo hit always equals a fresh prediction
+    widths = quantize_widths(leaf_widths)
+    key = (model_fingerprint, float(leaf_number), tuple(widths))
+
+    if ORIGINAL_MEMO_SIZE > 0:
+        cached = prediction_memo.get(key)
+        if cached is not None:
+            return cached
+
+    row = _feature_row(leaf_number, widths)
+
+    if ORIGINAL_BATCH_MAX_ROWS <= 1:
+        prediction = float(_predict(row[np.newaxis, :])[0])
+    else:
+        prediction = batcher.submit(row).result()
+
+    if ORIGINAL_MEMO_SIZE > 0:
+        prediction_memo.put(key, prediction)
+    return prediction
@@ -4,9 +4,12 @@ from .display_routes import display_bp
 from .inference_routes import inference_bp
 from .test_routes import test_bp
 from .scheduler_routes import scheduler_bp
+from .stats_routes import stats_bp
 
 def register_routes(app):
     app.register_blueprint(send_bp)
     app.register_blueprint(display_bp)
     app.register_blueprint(inference_bp)
     app.register_blueprint(test_bp)
+    app.register_blueprint(stats_bp)
+    app.register_blueprint(scheduler_bp)
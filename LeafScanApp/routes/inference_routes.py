@@ -1,54 +1,199 @@
-from flask import Blueprint, jsonify, current_app
+import json
+import time
+from flask import Blueprint, Response, jsonify, request, current_app
+from config.inference import RESULT_WAIT_MAX_S, RESULT_STREAM_MAX_S, RESULT_STREAM_HEARTBEAT_S
+from config.inference import BULK_STATUS_MAX_IDS, BULK_STATUS_PAGE_SIZE
 from core.cache import CACHE_SCHEMA
 from core.inputs import routes_to_rerun
-from inference.all_schedulers import SCHEDULERS
+from core.dag import dispatch
 from core.dependencies import check_dependencies, dependencies_ready
-from inference.defoliation_schedule_inference import schedule_defoliation_inference
-from inference.original_schedule_inference import schedule_original_inference
-from inference.simulated_schedule_inference import schedule_simulated_inference
+from core.lanes import prioritize, queue_positions
+from core.notify import job_events
 from storage import get_meta_store, JobFields
 
 inference_bp = Blueprint("inference", __name__)
 
-@inference_bp.route("/inference/<entry_id>")
-def inference_entry(entry_id):
+def _inference_status(entry_id, reschedule=True) -> dict:
     """
-    Unified inference endpoint:
-    - Returns completed result if available.
-    - Reschedules defoliation if ready.
-    - Checks dependencies (original/simulated).
-    - Reports missing first-level data dependencies for uploads.
+    Status of an entry's defoliation result:
+    - "completed" with the result,
+    - "waiting" with the uploads needed to continue,
+    - "queued" while jobs are still running.
+    With reschedule, pending work is also prioritized and rerunnable stages kicked.
     """
-    #try:
     meta = get_meta_store()
-    result = defoliation = float(meta.get_field(entry_id, JobFields.RESULT_DEFOLIATION) or -1.0)
+    # One snapshot of the job hash answers both the result and the dependency checks
+    fields = meta.get_entry(entry_id)
+    result = defoliation = float(fields.get(JobFields.RESULT_DEFOLIATION) or -1.0)
     
     # 1️⃣ Return completed result immediately
-    if meta.get_field(entry_id, JobFields.OUT_DEFOLIATION) and (defoliation != -1):
+    if fields.get(JobFields.OUT_DEFOLIATION) == "1" and (defoliation != -1):
         meta.mark_results_fetched(entry_id)
-        return jsonify({
+        return {
             "status": "completed",
             "message": "✅ Defoliation result ready",
             "results": {"defoliation": defoliation},
-        })
+        }
+
+    ready, missing, rerunnable = dependencies_ready(entry_id, JobFields.OUT_DEFOLIATION, fields)
+    if not ready:
+        routes = routes_to_rerun(missing)
+    elif not reschedule:
+        return {
+            "status": "queued",
+            "message": f"📅 Defoliation pending for {entry_id}",
+        }
 
-    # 2️⃣ Otherwise, check for missing dependencies
-    ready, missing, rerunnable = dependencies_ready(entry_id, JobFields.OUT_DEFOLIATION)
-    for r in rerunnable:
-        job, queue_size = SCHEDULERS[r](entry_id, None)
+    if reschedule:
+        # 2️⃣ Someone is waiting on this entry: its pending work jumps the lanes
+        prioritize(entry_id)
+
+        # 3️⃣ Kick stages that can run; ones already dispatched for their
+        # current inputs are left alone (see core.dag)
+        dispatched = dispatch(entry_id, *rerunnable, *([JobFields.OUT_DEFOLIATION] if ready else []))
 
     if ready:
-        job, queue_size = schedule_defoliation_inference(entry_id)
-        return jsonify({
+        if JobFields.OUT_DEFOLIATION not in dispatched:
+            return {
+                "status": "queued",
+                "message": f"📅 Defoliation pending for {entry_id}",
+            }
+        job, queue_size = dispatched[JobFields.OUT_DEFOLIATION]
+        if job is None:
+            # Ran inline just now
+            return _inference_status(entry_id, reschedule=False)
+        return {
             "status": "queued",
             "message": f"📅 Defoliation job re-scheduled for {entry_id}",
             "jobs_ahead": queue_size,
             "job_id": job.id,
-        })
+        }
     else:
-        routes = routes_to_rerun(missing)
-        return jsonify({
+        return {
             "status": "waiting",
             "message": "⚙️ Waiting for dependencies",
             "reupload": routes
-        })
+        }
+
+@inference_bp.route("/inference/<entry_id>")
+def inference_entry(entry_id):
+    """
+    Unified inference endpoint:
+    - Returns completed result if available.
+    - Reschedules defoliation if ready.
+    - Checks dependencies (original/simulated).
+    - Reports missing first-level data dependencies for uploads.
+    With ?wait=<seconds> (capped at RESULT_WAIT_MAX_S) a queued entry is held
+    until it completes or needs a reupload, instead of being polled.
+    """
+    wait = min(request.args.get("wait", 0.0, type=float), RESULT_WAIT_MAX_S)
+    if wait <= 0:
+        return jsonify(_inference_status(entry_id))
+
+    # Watch first, so a change landing during the first check still wakes us
+    with job_events.watch(entry_id) as changes:
+        status = _inference_status(entry_id)
+        deadline = time.monotonic() + wait
+        while changes and status["status"] == "queued":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if changes.wait(remaining):
+                latest = _inference_status(entry_id, reschedule=False)
+                if latest["status"] != "queued":
+                    status = latest
+        return jsonify(status)
+
+def _sse(status: dict) -> str:
+    return f"event: status\ndata: {json.dumps(status)}\n\n"
+
+@inference_bp.route("/inference/<entry_id>/events")
+def inference_events(entry_id):
+    """
+    Server-Sent Events: a "status" event now and on every status change,
+    closing once the entry completes or needs a reupload (or after
+    RESULT_STREAM_MAX_S; clients reconnect).
+    """
+    def stream():
+        with job_events.watch(entry_id) as changes:
+            status = _inference_status(entry_id)
+            yield _sse(status)
+
+            deadline = time.monotonic() + RESULT_STREAM_MAX_S
+            while changes and status["status"] == "queued":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not changes.wait(min(remaining, RESULT_STREAM_HEARTBEAT_S)):
+                    yield ": keepalive\n\n"
+                    continue
+                latest = _inference_status(entry_id, reschedule=False)
+                if latest["status"] != "queued":
+                    status = latest
+                    yield _sse(status)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Column order of ?compact entries; reupload is the list of routes to call again
+BULK_COLUMNS = ["entry_id", "status", "defoliation", "reupload", "queue"]
+
+def _bulk_status(entry_id, fields, positions) -> dict:
+    """Read-only status of one entry from its job hash snapshot."""
+    defoliation = float(fields.get(JobFields.RESULT_DEFOLIATION) or -1.0)
+    if fields.get(JobFields.OUT_DEFOLIATION) == "1" and (defoliation != -1):
+        return {"entry_id": entry_id, "status": "completed", "defoliation": defoliation}
+
+    ready, missing, _ = dependencies_ready(entry_id, JobFields.OUT_DEFOLIATION, fields)
+    if not ready:
+        return {"entry_id": entry_id, "status": "waiting", "reupload": routes_to_rerun(missing)}
+    return {"entry_id": entry_id, "status": "queued", "queue": positions.get(entry_id, {})}
+
+@inference_bp.route("/inference/bulk", methods=["POST"])
+def inference_bulk():
+    """
+    Status of many entries in one request:
+      {"entry_ids": [...], "cursor": 0, "limit": 200, "compact": false}
+    All job hashes are read in one pipelined round trip and resolved in memory;
+    completed results are marked fetched together. Unlike /inference/<id>
+    nothing is rescheduled or prioritized: stages dispatch as their inputs land.
+    "queue" maps each lane the entry waits in to the jobs ahead of it there.
+    A page stops at limit entries; pass next_cursor back for the rest.
+    compact answers rows in BULK_COLUMNS order instead of objects.
+    """
+    data = request.get_json(silent=True) or {}
+    entry_ids = data.get("entry_ids")
+    if not isinstance(entry_ids, list) or not all(isinstance(e, str) for e in entry_ids):
+        return jsonify({"error": "entry_ids must be a list of strings"}), 400
+    if len(entry_ids) > BULK_STATUS_MAX_IDS:
+        return jsonify({"error": f"at most {BULK_STATUS_MAX_IDS} entry_ids per request"}), 400
+
+    try:
+        cursor = max(int(data.get("cursor", 0)), 0)
+        limit = min(max(int(data.get("limit", BULK_STATUS_PAGE_SIZE)), 1), BULK_STATUS_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+
+    page = entry_ids[cursor:cursor + limit]
+    meta = get_meta_store()
+    positions = queue_positions()
+    statuses = [
+        _bulk_status(entry_id, fields, positions)
+        for entry_id, fields in zip(page, meta.get_entries(page))
+    ]
+    meta.mark_results_fetched(*[s["entry_id"] for s in statuses if s["status"] == "completed"])
+
+    next_cursor = cursor + len(page)
+    response = {"next_cursor": next_cursor if next_cursor < len(entry_ids) else None}
+    if data.get("compact"):
+        for status in statuses:
+            if "reupload" in status:
+                status["reupload"] = [route for route, needed in status["reupload"].items() if needed]
+        response["columns"] = BULK_COLUMNS
+        response["entries"] = [[status.get(column) for column in BULK_COLUMNS] for status in statuses]
+    else:
+        response["entries"] = statuses
+    return jsonify(response)
@@ -1,10 +1,26 @@
 import os, json
 from flask import Blueprint, request, jsonify, current_app
 
-from core.scheduler import inference_scheduler
+from core.lanes import lane_stats
+from core.scheduler import inference_scheduler, inference_jobstore, upload_jobstore, queued_count
+from storage.DataNode import breaker_stats
+from storage.Upload import upload_stats
 
 scheduler_bp = Blueprint("scheduler", __name__)
 
+@scheduler_bp.route("/status", methods=["GET"])
+def get_scheduler_status():
+    """Per-lane queue depth and wait times, jobs not yet due in each store, upload bytes, data node breakers."""
+    return jsonify({
+        "lanes": lane_stats(),
+        "not_due": {
+            "inference": queued_count(inference_jobstore),
+            "upload": queued_count(upload_jobstore),
+        },
+        "uploads": upload_stats(),
+        "data_node": breaker_stats(),
+    })
+
 @scheduler_bp.route("/status/<job_id>", methods=["GET"])
 def get_job_status(job_id):
     job = inference_scheduler.get_job(job_id)
@@ -2,12 +2,15 @@ import os, json, time
 from flask import Blueprint, request, jsonify, current_app
 from core.paths import IMAGE_DIR, VIDEO_DIR, PARAMS_DIR
 
-from inference.original_schedule_inference import schedule_original_inference
-from inference.simulated_schedule_inference import schedule_simulated_inference
+from core.dag import advance
 from storage import ARTIFACTS, JobFields, JobTypes
 
 send_bp = Blueprint("send", __name__)
 
+def _client_id():
+    # Inference lanes share workers fairly between clients
+    return request.headers.get("X-Client-Id") or request.remote_addr or ""
+
 @send_bp.route("/send/image", methods=["POST"])
 def send_image():
     if "image" not in request.files:
@@ -25,13 +28,76 @@ def send_video():
     video = request.files["video"]
     base = os.path.splitext(video.filename)[0]
 
-    current_app.cache.save_video_stream(base, video)    
-    current_app.cache.update(base, JobTypes.SIMULATED_AREA, {JobFields.IN_VIDEO: video.filename}, new_data=True)
+    with current_app.cache.meta.batch():
+        current_app.cache.meta.update_field(base, JobFields.CLIENT, _client_id())
+        current_app.cache.save_video_stream(base, video)    
+        current_app.cache.update(base, JobTypes.SIMULATED_AREA, {JobFields.IN_VIDEO: video.filename}, new_data=True)
 
-    job, queue_size = schedule_simulated_inference(base, None)
+    advance(base, JobFields.IN_VIDEO)
 
     return jsonify({"status": "success", "filename": video.filename})
 
+@send_bp.route("/send/video/init", methods=["POST"])
+def send_video_init():
+    """Open or resume a chunked video upload; returns the byte ranges already received."""
+    data = request.get_json(force=True)
+    filename = data.get("filename")
+    size = data.get("size")
+
+    if not filename or size is None:
+        return jsonify({"status": "error", "message": "Missing filename or size"}), 400
+
+    base = os.path.splitext(filename)[0]
+    upload = current_app.cache.init_video_upload(base, filename, int(size))
+    current_app.cache.meta.update_field(base, JobFields.CLIENT, _client_id())
+
+    # The video only counts as an input once finalize has every byte
+    return jsonify({"status": "success", **upload})
+
+@send_bp.route("/send/video/chunk", methods=["POST"])
+def send_video_chunk():
+    """Write one chunk (raw request body) at ?filename=...&offset=..."""
+    filename = request.args.get("filename")
+    offset = request.args.get("offset", type=int)
+
+    if not filename or offset is None:
+        return jsonify({"status": "error", "message": "Missing filename or offset"}), 400
+
+    base = os.path.splitext(filename)[0]
+    try:
+        with current_app.cache.meta.batch():
+            upload = current_app.cache.save_video_chunk(base, offset, request.get_data())
+    except KeyError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 416
+
+    return jsonify({"status": "success", **upload})
+
+@send_bp.route("/send/video/finalize", methods=["POST"])
+def send_video_finalize():
+    data = request.get_json(force=True)
+    filename = data.get("filename")
+
+    if not filename:
+        return jsonify({"status": "error", "message": "Missing filename"}), 400
+
+    base = os.path.splitext(filename)[0]
+    try:
+        with current_app.cache.meta.batch():
+            upload = current_app.cache.finalize_video_upload(base)
+            if upload["complete"]:
+                current_app.cache.update(base, JobTypes.SIMULATED_AREA, {JobFields.IN_VIDEO: filename}, new_data=True)
+    except KeyError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+
+    if not upload["complete"]:
+        return jsonify({"status": "incomplete", **upload}), 409
+
+    advance(base, JobFields.IN_VIDEO)
+
+    return jsonify({"status": "success", "filename": filename})
+
 @send_bp.route("/send/params", methods=["POST"])
 def send_params():
     data = request.get_json(force=True)
@@ -45,10 +111,11 @@ def send_params():
 
     print(f"\nParams:\n{params}\n")
     
-    current_app.cache.update(base, JobTypes.ORIGINAL_AREA, params, new_data=True)
-    current_app.cache.update(base, JobTypes.SIMULATED_AREA, params, new_data=True)
+    with current_app.cache.meta.batch():
+        current_app.cache.meta.update_field(base, JobFields.CLIENT, _client_id())
+        current_app.cache.update(base, JobTypes.ORIGINAL_AREA, params, new_data=True)
+        current_app.cache.update(base, JobTypes.SIMULATED_AREA, params, new_data=True)
 
-    job, queue_size = schedule_original_inference(base, None)
-    job, queue_size = schedule_simulated_inference(base, None)
+    advance(base, *params)
 
     return jsonify({"status": "success", "filename": filename})
@@ -0,0 +1,9 @@
+from flask import Blueprint, jsonify
+
+from core.metrics import get_metrics
+
+stats_bp = Blueprint("stats", __name__)
+
+@stats_bp.route("/stats", methods=["GET"])
+def get_stats():
+    return jsonify(get_metrics())
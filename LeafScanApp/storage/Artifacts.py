@@ -11,6 +11,9 @@ class Artifact:
     input_flag: Optional[str] = None
     output_flag: Optional[str] = None
     upload_flag: Optional[str] = None
+    version_field: Optional[str] = None
+    checksum_field: Optional[str] = None
+    size_field: Optional[str] = None
            
 
 def artifact_from_filename(filename: str) -> Artifact | None:
@@ -26,23 +29,34 @@ ARTIFACTS = {
         pattern="*_video.mp4",
         input_flag=JobFields.IN_VIDEO,
         upload_flag=JobFields.UP_VIDEO,
+        checksum_field=JobFields.SUM_VIDEO,
+        size_field=JobFields.SIZE_VIDEO,
     ),
 
     JobTypes.ORIGINAL_AREA: Artifact(
         pattern="*_original_area.json",
         output_flag=JobFields.OUT_ORIGINAL,
         upload_flag=JobFields.UP_ORIGINAL,
+        version_field=JobFields.VER_ORIGINAL,
+        checksum_field=JobFields.SUM_ORIGINAL,
+        size_field=JobFields.SIZE_ORIGINAL,
     ),
 
     JobTypes.SIMULATED_AREA: Artifact(
         pattern="*_simulated_area.json",
         output_flag=JobFields.OUT_SIMULATED,
         upload_flag=JobFields.UP_SIMULATED,
+        version_field=JobFields.VER_SIMULATED,
+        checksum_field=JobFields.SUM_SIMULATED,
+        size_field=JobFields.SIZE_SIMULATED,
     ),
 
     JobTypes.DEFOLIATION: Artifact(
         pattern="*_defoliation.json",
         output_flag=JobFields.OUT_DEFOLIATION,
-        upload_flag=JobFields.UP_DEFOLIATION
+        upload_flag=JobFields.UP_DEFOLIATION,
+        version_field=JobFields.VER_DEFOLIATION,
+        checksum_field=JobFields.SUM_DEFOLIATION,
+        size_field=JobFields.SIZE_DEFOLIATION,
     )
 }
\ No newline at end of file
@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from config.storage import UPLOAD_BANDWIDTH_BPS, UPLOAD_RATE_BURST_BYTES, UPLOAD_RATE_WINDOW_S
+
+# Upload classes, in the order they get bandwidth
+RESULTS = 0
+VIDEOS = 1
+
+
+class BandwidthLimiter:
+    """
+    Token bucket of rate_bps bytes per second (0 = uncapped).
+
+    Waiters are served in (class, bytes left in their transfer) order, so
+    results go before videos and a nearly finished transfer before a fresh
+    one. Bytes granted are also the throughput reported for the limiter.
+    """
+
+    def __init__(self, rate_bps: float = 0, burst_bytes: int = UPLOAD_RATE_BURST_BYTES):
+        self.rate = float(rate_bps)
+        self.burst = int(burst_bytes)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._sent = 0
+        self._window = deque()   # (monotonic time, bytes) granted within UPLOAD_RATE_WINDOW_S
+
+    def grant_size(self, n: int) -> int:
+        """Largest piece of an n byte read that one acquire can cover."""
+        return min(n, self.burst) if self.rate > 0 else n
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def _record(self, now, n):
+        self._sent += n
+        self._window.append((now, n))
+        while self._window and self._window[0][0] < now - UPLOAD_RATE_WINDOW_S:
+            self._window.popleft()
+
+    def acquire(self, n: int, cls: int = RESULTS, remaining: int = 0):
+        """Block until n bytes (at most grant_size) may be sent."""
+        with self._cond:
+            if self.rate <= 0:
+                self._record(time.monotonic(), n)
+                return
+
+            me = (cls, remaining, next(self._seq))
+            heapq.heappush(self._waiters, me)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] is me:
+                        if self._tokens >= n:
+                            self._tokens -= n
+                            heapq.heappop(self._waiters)
+                            self._record(now, n)
+                            return
+                        self._cond.wait((n - self._tokens) / self.rate)
+                    else:
+                        self._cond.wait()
+            finally:
+                if me in self._waiters:
+                    self._waiters.remove(me)
+                    heapq.heapify(self._waiters)
+                # The next in line takes over the bucket
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            recent = sum(n for t, n in self._window if t >= now - UPLOAD_RATE_WINDOW_S)
+            return {
+                "cap_bps": self.rate or None,
+                "sent_bytes": self._sent,
+                "throughput_bps": recent / UPLOAD_RATE_WINDOW_S,
+                "waiting": len(self._waiters),
+            }
+
+
+class ThrottledReader:
+    """
+    File-like view of length bytes of f from its current position, read
+    under the global limiter and a per-transfer cap. len() lets requests
+    send a Content-Length instead of a chunked body.
+    """
+
+    def __init__(self, f, length: int, limiter: BandwidthLimiter, transfer_bps: float = 0,
+                 cls: int = RESULTS, on_read=None):
+        self.f = f
+        self.length = length
+        self.left = length
+        self.limiter = limiter
+        self.transfer = BandwidthLimiter(transfer_bps) if transfer_bps else None
+        self.cls = cls
+        self.on_read = on_read
+
+    def __len__(self):
+        return self.left
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            return b"".join(iter(lambda: self.read(self.left), b""))
+        n = min(n, self.left)
+        if n <= 0:
+            return b""
+        n = self.limiter.grant_size(n)
+        if self.transfer:
+            n = self.transfer.grant_size(n)
+            self.transfer.acquire(n)
+        self.limiter.acquire(n, self.cls, self.left)
+        data = self.f.read(n)
+        self.left -= len(data)
+        if self.on_read:
+            self.on_read(len(data))
+        return data
+
+
+# One bucket for every upload this process makes
+upload_limiter = BandwidthLimiter(UPLOAD_BANDWIDTH_BPS)
@@ -1,18 +1,43 @@
+import os
+import shutil
+import tempfile
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+from .Checksum import HashingReader
+
+
+class Written(NamedTuple):
+    """A whole-artifact write: bytes charged, artifact size and sha256, hashed as it was written."""
+    delta: int
+    size: int
+    digest: str
+
 
 class ComputeCache(ABC):
-    """Ephemeral, fast, node-local storage for compute."""
+    """
+    Ephemeral, fast, node-local storage for compute.
+    Writes and deletes return the change in bytes charged to the entry,
+    so the meta store can account for them without rescanning;
+    whole-artifact writes also return the artifact's checksum.
+    """
+
+    @abstractmethod
+    def put(self, artifact_name: str, data: bytes, entry_id: str | None = None) -> Written:
+        pass
 
     @abstractmethod
-    def put(self, artifact_name: str, data: bytes, entry_id: str | None = None) -> None:
+    def put_stream(self, artifact_name: str, stream, entry_id: str | None = None) -> Written:
         pass
 
     @abstractmethod
-    def put_stream(self, artifact_name: str, stream, entry_id: str | None = None) -> None:
+    def put_chunk(self, artifact_name: str, chunk: bytes, entry_id: str | None = None, offset: int | None = None) -> int:
         pass
 
     @abstractmethod
-    def put_chunk(self, artifact_name: str, chunk: bytes, entry_id: str | None = None):
+    def move(self, src_artifact: str, dst_artifact: str, entry_id: str | None = None) -> int:
         pass
 
     @abstractmethod
@@ -23,12 +48,41 @@ class ComputeCache(ABC):
     def get_stream(self, artifact_name: str, entry_id: str | None = None):
         pass
 
+    @contextmanager
+    def local_path(self, artifact_name: str, entry_id: str | None = None):
+        """
+        Yield a local filesystem path to read the artifact from.
+        Backends without local files spill the artifact to a temp file.
+        """
+        suffix = Path(artifact_name).suffix
+        with self.get_stream(artifact_name, entry_id=entry_id) as stream:
+            with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                shutil.copyfileobj(stream, tmp)
+        try:
+            yield Path(tmp.name)
+        finally:
+            if os.path.exists(tmp.name):
+                os.remove(tmp.name)
+
+    def checksum(self, artifact_name: str, entry_id: str | None = None) -> str:
+        """sha256 of an artifact built from put_chunk writes. Backends that hash chunks as they land avoid this read."""
+        with self.get_stream(artifact_name, entry_id=entry_id) as stream:
+            reader = HashingReader(stream)
+            while reader.read(1024*1024):
+                pass
+        return reader.hexdigest()
+
     @abstractmethod
     def exists(self, artifact_name: str, entry_id: str | None = None) -> bool:
         pass
 
     @abstractmethod
-    def delete(self, artifact_name: str | None = None, entry_id: str | None = None) -> None:
+    def artifact_path(self, artifact_name: str, entry_id: str | None = None) -> Path:
+        """Where the artifact lives on local disk, whether or not it exists yet."""
+        pass
+
+    @abstractmethod
+    def delete(self, artifact_name: str | None = None, entry_id: str | None = None) -> int:
         pass
 
     @abstractmethod
@@ -3,18 +3,35 @@
 import time
 import redis
 import os
-import copy
-
-from config.storage import CACHE_LOCATION, CACHE_MAX_BYTES
+import json
+import threading
+from contextlib import contextmanager
+
+from config.storage import (
+    CACHE_LOCATION, CACHE_MAX_BYTES, UPLOAD_TTL_S, RESULT_INDEX_TTL_S,
+    EVICTION_POLICY, EVICTION_CLAIM_TTL_S, EVICTION_BATCH_SIZE, EVICTION_SCAN_WINDOW,
+    CACHE_HIGH_WATERMARK, CACHE_LOW_WATERMARK, CACHE_HARD_LIMIT, VERSION_LOCK_TIMEOUT_S
+)
+from core.metrics import counter
+from core.scheduler import active_entries, maintenance_scheduler
 
 from .Cache import ComputeCache
 from .FSCache import FileSystemComputeCache
+from .Eviction import get_eviction_policy
+from .Artifacts import ARTIFACTS
 from .JobSchema import JOB_SCHEMA, JobFields
+from .MetaScripts import (
+    SET_ENTRY_BYTES, PURGE_ENTRY_BYTES, ADD_BLOB_REF, RELEASE_BLOB_REF,
+    TOUCH_ENTRY, RECORD_FETCH, RECONCILE_TOTAL, PICK_EVICTION_VICTIMS, CLAIM_STAGE
+)
 
 
 _redis = None
 _cache_meta_store = None
 
+# Field changes to job:{entry_id} are published on JOB_EVENTS_PREFIX + entry_id
+JOB_EVENTS_PREFIX = "events:job:"
+
 def get_meta_store():
     global _cache_meta_store
     if _cache_meta_store is None:
@@ -30,11 +47,35 @@ def get_redis():
         _redis = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
     return _redis
 
+def merge_ranges(members) -> list:
+    """Merge "start-end" range members into sorted, non-overlapping [start, end) pairs."""
+    ranges = sorted(tuple(int(x) for x in m.split("-")) for m in members)
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
 class CacheMetaStore:
-    def __init__(self, backend: ComputeCache, max_bytes: int):
+    def __init__(self, backend: ComputeCache, max_bytes: int, eviction_policy: str = EVICTION_POLICY):
         self.r = get_redis()
         self.backend = backend
         self.max_bytes = int(max_bytes)
+        self.eviction_policy = get_eviction_policy(eviction_policy)
+        self._local = threading.local()
+
+        # Server-side scripts: byte accounting and victim picking stay atomic
+        self._set_entry_bytes = self.r.register_script(SET_ENTRY_BYTES)
+        self._purge_entry_bytes = self.r.register_script(PURGE_ENTRY_BYTES)
+        self._add_blob_ref = self.r.register_script(ADD_BLOB_REF)
+        self._release_blob_ref = self.r.register_script(RELEASE_BLOB_REF)
+        self._touch_entry = self.r.register_script(TOUCH_ENTRY)
+        self._record_fetch = self.r.register_script(RECORD_FETCH)
+        self._reconcile_total = self.r.register_script(RECONCILE_TOTAL)
+        self._pick_victims = self.r.register_script(PICK_EVICTION_VICTIMS)
+        self._claim_stage = self.r.register_script(CLAIM_STAGE)
 
         # initialize global limits once
         self.r.setnx("cache:max_bytes", self.max_bytes)
@@ -44,32 +85,125 @@ class CacheMetaStore:
     # Job Management
     # ----------------------------
 
-    def init_entry(self, entry_id: str):
+    def _queue_init(self, pipe, entry_id: str, now: float):
+        """Queue an idempotent init: fills only missing fields, so no EXISTS round trip."""
         key = f"job:{entry_id}"
-        if self.r.exists(key):
-            return
-
-        now = time.time()
-        schema = copy.deepcopy(JOB_SCHEMA)
-        schema["created_at"] = now
-        schema["last_updated"] = now
+        for field, default in JOB_SCHEMA.items():
+            pipe.hsetnx(key, field, default)
+        pipe.hsetnx(key, JobFields.CREATED_AT, now)
+        pipe.hsetnx(key, JobFields.LAST_UPDATED, now)
+        pipe.zadd("cache:lru", {entry_id: now}, nx=True)
+        pipe.zadd("cache:bytes", {entry_id: 0}, nx=True)
+        pipe.zadd("cache:expired", {entry_id: now + (3600 * 24)}, nx=True)
 
+    def init_entry(self, entry_id: str):
         pipe = self.r.pipeline()
-        pipe.hset(key, mapping=schema)
-        pipe.zadd("cache:lru", {entry_id: now})
-        pipe.zadd("cache:bytes", {entry_id: 0})
-        pipe.zadd("cache:expired", {entry_id: now + (3600 * 24)})
+        self._queue_init(pipe, entry_id, time.time())
         pipe.execute()
 
     def ensure_exists(self, entry_id):
+        self.init_entry(entry_id)
+
+    def get_fields(self, entry_id: str, *fields) -> dict:
+        """Read several fields in one round trip, including writes queued in the current batch."""
         key = f"job:{entry_id}"
-        if not self.r.exists(key):
-            self.init_entry(entry_id) 
+        pipe = self.r.pipeline()
+        pipe.exists(key)
+        pipe.hmget(key, fields)
+        exists, values = pipe.execute()
+
+        if not exists:
+            self.init_entry(entry_id)
+            values = [JOB_SCHEMA.get(f) for f in fields]
+            values = [None if v is None else str(v) for v in values]
+
+        result = dict(zip(fields, values))
+        batch = self._batch()
+        if batch:
+            result.update(batch.pending(entry_id, fields))
+        return result
 
     def get_field(self, entry_id: str, field: str):
-        self.ensure_exists(entry_id)
-        val = self.r.hget(f"job:{entry_id}", field)
-        return val
+        return self.get_fields(entry_id, field)[field]
+
+    # ----------------------------
+    # Batching
+    # ----------------------------
+
+    def _batch(self):
+        return getattr(self._local, "batch", None)
+
+    @contextmanager
+    def batch(self):
+        """
+        Unit of work for the calling thread: field updates, touches, byte
+        updates and space checks are queued and flushed in one pipeline on exit.
+        Reads inside the batch see the queued fields. Nested batches join
+        the outermost one. If the body raises, the queued writes still land
+        (they record files already written) but deferred work is dropped.
+        """
+        batch = self._batch()
+        if batch:
+            yield batch
+            return
+
+        batch = MetaBatch(self)
+        self._local.batch = batch
+        failed = False
+        try:
+            yield batch
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            # commit() may have swapped in a fresh batch
+            batch = self._local.batch
+            self._local.batch = None
+            if failed:
+                batch.deferred.clear()
+            batch.flush()
+
+    def commit(self):
+        """Flush the current batch now rather than on exit; later writes queue afresh."""
+        batch = self._batch()
+        if batch:
+            self._local.batch = MetaBatch(self)
+            batch.flush()
+
+    def defer(self, func, *args):
+        """Run func after the current batch flushes (immediately if there is none)."""
+        batch = self._batch()
+        if batch:
+            batch.deferred.append((func, args))
+        else:
+            func(*args)
+
+    # ----------------------------
+    # Input Versions
+    # ----------------------------
+
+    def get_version(self, entry_id: str, field: str) -> int:
+        """Read straight from Redis: running jobs compare it against the version they started from."""
+        return int(self.r.hget(f"job:{entry_id}", field) or 0)
+
+    def bump_version(self, entry_id: str, field: str) -> int:
+        """Not batched, so runs working from the old inputs see it at their next checkpoint."""
+        return self.r.hincrby(f"job:{entry_id}", field, 1)
+
+    def claim_stage(self, entry_id: str, stage: str, version_field: str, upstream) -> bool:
+        """True for exactly one caller per input version once all of stage's upstream flags are set."""
+        return bool(self._claim_stage(
+            keys=[f"job:{entry_id}"],
+            args=[stage, f"dispatched:{stage}", version_field, *upstream],
+        ))
+
+    def release_stage(self, entry_id: str, stage: str):
+        """Drop stage's claim after a failed run, so it can be dispatched again for the same inputs."""
+        self.r.hdel(f"job:{entry_id}", f"dispatched:{stage}")
+
+    def version_lock(self, entry_id: str, field: str):
+        """Held while a step's inputs change or its result is written, so neither lands on the other."""
+        return self.r.lock(f"lock:{entry_id}:{field}", timeout=VERSION_LOCK_TIMEOUT_S)
 
     # ----------------------------
     # Update Tracking
@@ -77,42 +211,225 @@ class CacheMetaStore:
 
     def touch(self, entry_id: str):
         """Update last_updated timestamp and LRU score."""
-        self.ensure_exists(entry_id)
-        
-        now = time.time()
-        key = f"job:{entry_id}"
+        batch = self._batch()
+        if batch:
+            batch.touched.add(entry_id)
+            return
+
         pipe = self.r.pipeline()
-        pipe.hset(key, mapping={
-            "last_updated": now
-        })
-        pipe.zadd("cache:lru", {entry_id: now})
+        self._queue_init(pipe, entry_id, time.time())
+        self._queue_touch(pipe, entry_id, time.time())
         pipe.execute()
 
+    def _queue_touch(self, pipe, entry_id: str, now: float):
+        self._touch_entry(
+            keys=[
+                f"job:{entry_id}", "cache:lru", "cache:freq",
+                "cache:bytes", "cache:gdsf", "cache:gdsf_clock",
+            ],
+            args=[entry_id, now, JobFields.LAST_UPDATED],
+            client=pipe
+        )
+
     def update_field(self, entry_id: str, field: str, val=1):
         if field not in JOB_SCHEMA:
             return
 
-        self.ensure_exists(entry_id)
-        self.r.hset(f"job:{entry_id}", field, val)
-        self.touch(entry_id)
+        batch = self._batch()
+        if batch:
+            batch.fields.setdefault(entry_id, {})[field] = val
+            batch.touched.add(entry_id)
+            return
 
-    def update_bytes(self, entry_id: str):
-        """Recompute job size from backend, update total bytes, and touch entry."""
-        self.ensure_exists(entry_id)
-        key = f"job:{entry_id}"
+        now = time.time()
+        pipe = self.r.pipeline()
+        self._queue_init(pipe, entry_id, now)
+        pipe.hset(f"job:{entry_id}", field, val)
+        self._queue_touch(pipe, entry_id, now)
+        self._queue_publish(pipe, entry_id, {field: val})
+        pipe.execute()
 
-        new_size_bytes = self.backend.compute_entry_size(entry_id)
-        old_size = int(self.r.hget(key, "bytes") or 0)
-        delta = new_size_bytes - old_size
+    def _queue_publish(self, pipe, entry_id: str, fields: dict):
+        """Wake requests waiting on entry_id (see core/notify.py)."""
+        pipe.publish(JOB_EVENTS_PREFIX + entry_id, json.dumps(fields, default=str))
+
+    def add_bytes(self, entry_id: str, delta: int):
+        """Apply a byte delta returned by a backend write, and touch entry."""
+        batch = self._batch()
+        if batch:
+            batch.deltas[entry_id] = batch.deltas.get(entry_id, 0) + delta
+            batch.touched.add(entry_id)
+            return
 
+        now = time.time()
         pipe = self.r.pipeline()
-        pipe.hset(key, "bytes", new_size_bytes)
-        pipe.zadd("cache:bytes", {entry_id: new_size_bytes})
-        pipe.incrby("cache:total_bytes", delta)
+        self._queue_init(pipe, entry_id, now)
+        self._queue_delta(pipe, entry_id, delta)
+        self._queue_touch(pipe, entry_id, now)
         pipe.execute()
 
-        self.touch(entry_id)
+    def _queue_delta(self, pipe, entry_id: str, delta: int):
+        # Applied inside the pipeline's MULTI, so counters move together
+        if delta:
+            pipe.hincrby(f"job:{entry_id}", JobFields.BYTES, delta)
+            pipe.zincrby("cache:bytes", delta, entry_id)
+            pipe.incrby("cache:total_bytes", delta)
+
+    def update_bytes(self, entry_id: str) -> int:
+        """Recompute job size from a full backend rescan. Returns the drift corrected."""
+        # The old size is read and the delta applied inside Redis, so
+        # concurrent updates to the same entry cannot double count
+        return self._set_entry_bytes(
+            keys=[f"job:{entry_id}", "cache:bytes", "cache:total_bytes"],
+            args=[entry_id, JobFields.BYTES, self.backend.compute_entry_size(entry_id)]
+        )
+
+    def reconcile_bytes(self) -> dict:
+        """
+        Rescan idle entries on disk against their recorded bytes, then
+        rebuild cache:total_bytes from entries and blobs. Reports drift.
+        """
+        active = active_entries()
+        drifted = 0
+        drift_bytes = 0
+        for entry_id in self.r.zrange("cache:bytes", 0, -1):
+            if entry_id in active:
+                # Writes in flight; the next pass will see them settled
+                continue
+            delta = self.update_bytes(entry_id)
+            if delta:
+                drifted += 1
+                drift_bytes += abs(delta)
+                print(f"⚖️ {entry_id}: recorded bytes off by {-delta}")
+
+        total_drift = self._reconcile_total(
+            keys=["cache:total_bytes", "cache:bytes", "cas:refs", "cas:bytes"]
+        )
+
+        counter("bytes_reconcile_runs").inc()
+        counter("bytes_drift_entries").inc(drifted)
+        counter("bytes_drift_bytes").inc(drift_bytes + abs(total_drift))
+        print(f"⚖️ Reconciled bytes: {drifted} entries drifted by {drift_bytes}, total off by {-total_drift}")
+        return {"entries": drifted, "entry_bytes": drift_bytes, "total_bytes": -total_drift}
    
+    # ----------------------------
+    # Chunked Uploads
+    # ----------------------------
+
+    def init_upload(self, entry_id: str, filename: str, size: int, partial: str):
+        """partial is the artifact the chunks are written to, removed if the upload is abandoned."""
+        key = f"upload:{entry_id}"
+        now = time.time()
+        pipe = self.r.pipeline()
+        pipe.delete(key, f"{key}:ranges")
+        pipe.hset(key, mapping={"filename": filename, "size": size, "started_at": now})
+        pipe.expire(key, UPLOAD_TTL_S)
+        pipe.zadd("uploads:open", {entry_id: now})
+        pipe.hset("uploads:partial", entry_id, partial)
+        pipe.execute()
+
+    def add_upload_range(self, entry_id: str, start: int, end: int):
+        key = f"upload:{entry_id}"
+        pipe = self.r.pipeline()
+        pipe.zadd(f"{key}:ranges", {f"{start}-{end}": start})
+        pipe.expire(key, UPLOAD_TTL_S)
+        pipe.expire(f"{key}:ranges", UPLOAD_TTL_S)
+        pipe.zadd("uploads:open", {entry_id: time.time()}, xx=True)
+        pipe.execute()
+
+    def get_upload(self, entry_id: str) -> dict | None:
+        """Upload info with merged received ranges, or None if no upload is open."""
+        key = f"upload:{entry_id}"
+        pipe = self.r.pipeline()
+        pipe.hgetall(key)
+        pipe.zrange(f"{key}:ranges", 0, -1)
+        info, members = pipe.execute()
+        if not info:
+            return None
+
+        ranges = merge_ranges(members)
+        size = int(info["size"])
+        next_offset = ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+        return {
+            "filename": info["filename"],
+            "size": size,
+            "received": ranges,
+            "next_offset": next_offset,
+            "complete": next_offset >= size,
+        }
+
+    def clear_upload(self, entry_id: str):
+        pipe = self.r.pipeline()
+        pipe.delete(f"upload:{entry_id}", f"upload:{entry_id}:ranges")
+        pipe.zrem("uploads:open", entry_id)
+        pipe.hdel("uploads:partial", entry_id)
+        pipe.execute()
+
+    def sweep_abandoned_uploads(self) -> int:
+        """Delete the partial files of uploads idle for UPLOAD_TTL_S; their ranges have expired with them."""
+        idle = self.r.zrangebyscore("uploads:open", "-inf", time.time() - UPLOAD_TTL_S)
+        for entry_id in idle:
+            partial = self.r.hget("uploads:partial", entry_id)
+            if partial:
+                self.add_bytes(entry_id, self.backend.delete(partial, entry_id=entry_id))
+            self.clear_upload(entry_id)
+        if idle:
+            print(f"🧹 Dropped {len(idle)} abandoned uploads")
+        return len(idle)
+
+    # ----------------------------
+    # Batched Uploads
+    # ----------------------------
+
+    def hold_batched(self, entry_id: str, step: str, local_path, attempt: int):
+        """Record an artifact waiting for an upload batch, so a restart does not lose it."""
+        self.r.hset("uploads:batched", f"{entry_id}:{step}", json.dumps({"path": str(local_path), "attempt": attempt}))
+
+    def release_batched(self, items):
+        """Forget (entry_id, step) items their batch has settled: uploaded, dropped or sent on their own."""
+        if items:
+            self.r.hdel("uploads:batched", *(f"{entry_id}:{step}" for entry_id, step in items))
+
+    def held_batched(self) -> list:
+        """(entry_id, step, local_path, attempt) for every artifact still waiting for a batch."""
+        held = []
+        for field, value in self.r.hgetall("uploads:batched").items():
+            entry_id, step = field.rsplit(":", 1)
+            item = json.loads(value)
+            held.append((entry_id, step, item["path"], item["attempt"]))
+        return held
+
+    # ----------------------------
+    # Content Index
+    # ----------------------------
+
+    def add_blob_ref(self, digest: str, size: int) -> int:
+        """Count one more entry sharing a blob. Its bytes are charged on the first reference."""
+        refs, _ = self._add_blob_ref(
+            keys=["cas:refs", "cas:bytes", "cache:total_bytes"],
+            args=[digest, size]
+        )
+        return refs
+
+    def release_blob_ref(self, digest: str) -> int:
+        """Drop one reference to a blob. Returns the bytes freed (non-zero only for the last reference)."""
+        refs, size = self._release_blob_ref(
+            keys=["cas:refs", "cas:bytes", "cache:total_bytes"],
+            args=[digest]
+        )
+        if refs > 0:
+            return 0
+
+        self.backend.delete_blob(digest)
+        return size
+
+    def get_result(self, step: str, input_hash: str):
+        val = self.r.get(f"cas:result:{step}:{input_hash}")
+        return None if val is None else json.loads(val)
+
+    def set_result(self, step: str, input_hash: str, value):
+        self.r.set(f"cas:result:{step}:{input_hash}", json.dumps(value), ex=RESULT_INDEX_TTL_S)
+
     # ----------------------------
     # Eviction
     # ----------------------------
@@ -149,70 +466,152 @@ class CacheMetaStore:
 
         return True
 
-    def evict_jobs_for_space(self):
-        max_bytes = int(self.r.get("cache:max_bytes"))
-        total = self.get_total_bytes()
-
-        if total <= max_bytes:
+    def ensure_space(self):
+        """
+        Called after writes. Above the high watermark eviction is handed to
+        the maintenance scheduler; only above the hard limit does the writer
+        wait for eviction itself.
+        """
+        batch = self._batch()
+        if batch:
+            batch.ensure_space = True
             return
 
-        now = time.time()
-
-        # 1️⃣ Evict expired jobs (artifacts + metadata)
-        expired = self.r.zrangebyscore("cache:expired", 0, now)
-
-        for entry_id in expired:
-            size_bytes = self.purge_job_artifacts(entry_id)
-            self.purge_job_metadata(entry_id)
-            total -= size_bytes
-        
-        if total <= max_bytes:
-                return
-
-        # 2️⃣ Evict completed jobs (artifacts only)
-        completed = self.r.zrange("cache:completed", 0, -1)
+        total, max_bytes = self.r.mget("cache:total_bytes", "cache:max_bytes")
+        total = int(total or 0)
+        max_bytes = float(max_bytes or self.max_bytes)
+        if total <= max_bytes * CACHE_HIGH_WATERMARK:
+            return
 
-        for entry_id in completed:
-            size = self.purge_job_artifacts(entry_id)
-            self.r.zrem("cache:completed", entry_id)
-            total -= size
-            if total <= max_bytes:
-                return
+        maintenance_scheduler.add_job(
+            func=self.evict_jobs_for_space,
+            id="evict_for_space",
+            replace_existing=True
+        )
+        if total <= max_bytes * CACHE_HARD_LIMIT:
+            return
 
-        # 3️⃣ Hard stop
-        raise RuntimeError("Space Full - Try again later")
+        # Over the hard limit: make room before this writer moves on
+        if not self.evict_jobs_for_space(trigger=CACHE_HARD_LIMIT, target=CACHE_HARD_LIMIT):
+            raise RuntimeError("Space Full - Try again later")
 
-    def mark_results_fetched(self, entry_id: str):
+    def evict_jobs_for_space(self, trigger=CACHE_HIGH_WATERMARK, target=CACHE_LOW_WATERMARK) -> bool:
+        """
+        Once the cache is above trigger * max bytes, evict down to
+        target * max bytes. Returns False if that could not be reached.
+        """
+        return self._evict(trigger, target, self.eviction_policy)
+
+    def sweep_expired(self):
+        """Drop expired jobs whatever the cache size."""
+        self._evict(-1, 1, [])
+
+    def _evict(self, trigger, target, ranked) -> bool:
+        total, max_bytes = self.r.mget("cache:total_bytes", "cache:max_bytes")
+        max_bytes = float(max_bytes or self.max_bytes)
+        if int(total or 0) <= max_bytes * trigger:
+            return True
+        under_target = int(total or 0) <= max_bytes * target
+
+        # Expired jobs go first, then each ranked set lowest score first
+        for kind, zset in [("expired", "cache:expired"), *ranked]:
+            offset = 0
+            while kind == "expired" or not under_target:
+                # Sets are read a window at a time; the script only sees that window
+                if kind == "expired":
+                    window = self.r.zrangebyscore(zset, 0, time.time(), start=offset, num=EVICTION_SCAN_WINDOW)
+                else:
+                    window = self.r.zrange(zset, offset, offset + EVICTION_SCAN_WINDOW - 1)
+                if not window:
+                    break
+
+                protected = active_entries()
+                under_target, examined, *picked = self._pick_victims(
+                    keys=[
+                        "cache:total_bytes", "cache:max_bytes", "cache:evicting",
+                        "cas:refs", "cas:bytes", "cache:completed", "cache:gdsf_clock",
+                        zset, *[f"job:{entry_id}" for entry_id in window],
+                    ],
+                    args=[
+                        time.time(), JobFields.BYTES, JobFields.VIDEO_HASH, EVICTION_CLAIM_TTL_S,
+                        target, EVICTION_BATCH_SIZE, kind, len(window), *window,
+                        *[int(entry_id in protected) for entry_id in window],
+                    ]
+                )
+                self._purge_victims(picked, kind)
+
+                # Victims picked from these sets left them, shifting the rest up
+                if kind == "expired" or zset == "cache:completed":
+                    examined -= len(picked)
+                offset += examined
+
+        return bool(under_target)
+
+    def _purge_victims(self, picked, kind: str):
+        for entry_id in picked:
+            try:
+                # 1️⃣ Expired jobs lose artifacts + metadata
+                size_bytes = self.purge_job_artifacts(entry_id)
+                if kind == "expired":
+                    self.purge_job_metadata(entry_id)
+                # 2️⃣ Policy victims lose artifacts only
+            finally:
+                self.r.zrem("cache:evicting", entry_id)
+
+            counter(f"evicted_bytes_{kind}").inc(size_bytes)
+            counter(f"evicted_entries_{kind}").inc()
+
+    def mark_results_fetched(self, *entry_ids: str):
+        if not entry_ids:
+            return
         expire_at = time.time() + 3600  # 1 hour
         
         pipe = self.r.pipeline()
-        pipe.hset(f"job:{entry_id}", JobFields.RESULT_FETCHED, "1")
-        pipe.zadd("cache:expired", {entry_id: expire_at})
+        for entry_id in entry_ids:
+            pipe.hset(f"job:{entry_id}", JobFields.RESULT_FETCHED, "1")
+            # A fetch is what counts as a hit for GDSF, not a write
+            self._record_fetch(
+                keys=["cache:freq", "cache:bytes", "cache:gdsf", "cache:gdsf_clock"],
+                args=[entry_id],
+                client=pipe
+            )
+        pipe.zadd("cache:expired", {entry_id: expire_at for entry_id in entry_ids})
         pipe.execute()
 
     def purge_job_artifacts(self, entry_id: str):
-        size_bytes = int(self.get_field(entry_id, JobFields.BYTES) or 0)
-        if size_bytes == 0:
-            return size_bytes
-
-        self.backend.delete(entry_id=entry_id)
-
-        pipe = self.r.pipeline()
-        pipe.hset(f"job:{entry_id}", mapping={
-            JobFields.BYTES: 0,
-            JobFields.ARTIFACTS_PURGED: 1,
-        })
-
-        pipe.decrby("cache:total_bytes", size_bytes)
-        pipe.execute()
-        
-        return size_bytes
+        # Shared video bytes are only freed with the last reference
+        shared_bytes = 0
+        video_hash = self.get_field(entry_id, JobFields.VIDEO_HASH)
+        if video_hash:
+            self.r.hset(f"job:{entry_id}", JobFields.VIDEO_HASH, "")
+            shared_bytes = self.release_blob_ref(video_hash)
+
+        size_bytes = self._purge_entry_bytes(
+            keys=[f"job:{entry_id}", "cache:bytes", "cache:total_bytes"],
+            args=[entry_id, JobFields.BYTES, JobFields.ARTIFACTS_PURGED]
+        )
+        if size_bytes or video_hash:
+            self.backend.delete(entry_id=entry_id)
+            # Recovery reads these to know which artifacts are on disk
+            self.r.hset(f"job:{entry_id}", mapping={
+                field: 0 if field == artifact.size_field else ""
+                for artifact in ARTIFACTS.values()
+                for field in (artifact.size_field, artifact.checksum_field)
+            })
+            self.r.publish(JOB_EVENTS_PREFIX + entry_id, json.dumps({JobFields.ARTIFACTS_PURGED: 1}))
+
+        return size_bytes + shared_bytes
 
     def purge_job_metadata(self, entry_id: str):
         pipe = self.r.pipeline()
         pipe.delete(f"job:{entry_id}")
         pipe.zrem("cache:lru", entry_id)
+        pipe.zrem("cache:bytes", entry_id)
+        pipe.zrem("cache:freq", entry_id)
+        pipe.zrem("cache:gdsf", entry_id)
         pipe.zrem("cache:expired", entry_id)
+        pipe.zrem("cache:completed", entry_id)
+        self._queue_publish(pipe, entry_id, {})
         pipe.execute()
 
 
@@ -221,8 +620,24 @@ class CacheMetaStore:
     # ----------------------------
 
     def get_entry(self, entry_id: str) -> dict:
-        return self.r.hgetall(f"job:{entry_id}")
+        entry = self.r.hgetall(f"job:{entry_id}")
+        batch = self._batch()
+        if batch:
+            entry.update(batch.pending(entry_id))
+        return entry
     
+    def get_entries(self, entry_ids) -> list:
+        """get_entry for many entries, in one round trip."""
+        pipe = self.r.pipeline(transaction=False)
+        for entry_id in entry_ids:
+            pipe.hgetall(f"job:{entry_id}")
+        entries = pipe.execute()
+        batch = self._batch()
+        if batch:
+            for entry_id, entry in zip(entry_ids, entries):
+                entry.update(batch.pending(entry_id))
+        return entries
+
     def get_total_bytes(self) -> int:
         return int(self.r.get("cache:total_bytes") or 0)
 
@@ -245,6 +660,15 @@ class CacheMetaStore:
         pipe.delete("cache:lru")
         pipe.delete("cache:bytes")
         pipe.delete("cache:expired")
+        pipe.delete("cache:completed")
+        pipe.delete("cache:evicting")
+        pipe.delete("cache:freq")
+        pipe.delete("cache:gdsf")
+        pipe.delete("cache:gdsf_clock")
+        pipe.delete("cas:refs")
+        pipe.delete("cas:bytes")
+        for key in self.r.scan_iter("cas:result:*"):
+            pipe.delete(key)
 
         # reinitialize limits
         pipe.set("cache:max_bytes", self.max_bytes)
@@ -255,7 +679,53 @@ class CacheMetaStore:
     def reset_job(self, entry_id):    
         in_video = self.get_field(entry_id, JobFields.IN_VIDEO)
         in_params = self.get_field(entry_id, JobFields.IN_PARAMS)
+        video_hash = self.get_field(entry_id, JobFields.VIDEO_HASH)
         self.r.delete(f"job:{entry_id}")
         self.init_entry(entry_id)
         self.update_field(entry_id, JobFields.IN_VIDEO, in_video)
-        self.update_field(entry_id, JobFields.IN_PARAMS, in_params)
\ No newline at end of file
+        self.update_field(entry_id, JobFields.IN_PARAMS, in_params)
+        self.update_field(entry_id, JobFields.VIDEO_HASH, video_hash)
+
+
+class MetaBatch:
+    """Writes queued by CacheMetaStore.batch(), applied together by flush()."""
+
+    def __init__(self, store: CacheMetaStore):
+        self.store = store
+        self.fields = {}
+        self.touched = set()
+        self.deltas = {}
+        self.ensure_space = False
+        self.deferred = []
+
+    def pending(self, entry_id: str, fields=None) -> dict:
+        queued = self.fields.get(entry_id, {})
+        return {
+            f: str(v) for f, v in queued.items()
+            if fields is None or f in fields
+        }
+
+    def flush(self):
+        store = self.store
+        if self.touched:
+            now = time.time()
+            pipe = store.r.pipeline()
+            for entry_id in self.touched:
+                store._queue_init(pipe, entry_id, now)
+            for entry_id, fields in self.fields.items():
+                pipe.hset(f"job:{entry_id}", mapping=fields)
+                store._queue_publish(pipe, entry_id, fields)
+            for entry_id, delta in self.deltas.items():
+                store._queue_delta(pipe, entry_id, delta)
+            for entry_id in self.touched:
+                store._queue_touch(pipe, entry_id, now)
+            pipe.execute()
+
+        # Follow-ups go out before the space check, which may raise
+        # "Space Full" back to the writer once the writes have landed
+        try:
+            for func, args in self.deferred:
+                func(*args)
+        finally:
+            if self.ensure_space:
+                store.ensure_space()
@@ -0,0 +1,52 @@
+import hashlib
+import threading
+
+
+class HashingReader:
+    """File-like wrapper that hashes bytes as they are read through it."""
+
+    def __init__(self, stream, algorithm: str = "sha256"):
+        self.stream = stream
+        self.hash = hashlib.new(algorithm)
+        self.size = 0
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.stream.read(n)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+
+class ChunkHasher:
+    """
+    Hashes a file written in positional chunks while they are written, as far
+    as they arrive in order. finish() reads only the bytes past the in-order
+    prefix from disk, so an in-order upload is never read back.
+    """
+
+    def __init__(self, algorithm: str = "sha256"):
+        self.hash = hashlib.new(algorithm)
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def update(self, offset: int, chunk: bytes):
+        with self._lock:
+            # Repeated chunks are already hashed; later ones wait for finish()
+            if offset <= self.offset < offset + len(chunk):
+                self.hash.update(chunk[self.offset - offset:])
+                self.offset = offset + len(chunk)
+
+    def finish(self, path) -> str:
+        with self._lock:
+            with open(path, "rb") as f:
+                f.seek(self.offset)
+                for chunk in iter(lambda: f.read(1024*1024), b""):
+                    self.hash.update(chunk)
+            return self.hash.hexdigest()
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
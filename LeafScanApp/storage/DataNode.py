@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.storage import (
+    UPLOAD_CONCURRENCY, UPLOAD_VIDEO_CONCURRENCY, UPLOAD_BACKOFF_BASE_S, UPLOAD_BACKOFF_MAX_S,
+    UPLOAD_BREAKER_THRESHOLD, UPLOAD_BREAKER_COOLDOWN_S, UPLOAD_BREAKER_MAX_COOLDOWN_S,
+)
+from core.metrics import counter
+
+_session = None
+_session_lock = threading.Lock()
+
+# data node url -> CircuitBreaker
+_breakers = {}
+
+
+class DataNodeDown(Exception):
+    """The data node's breaker is open; retry at retry_at (time.time())."""
+
+    def __init__(self, retry_at: float):
+        super().__init__(f"data node unavailable, retry in {max(retry_at - time.time(), 0):.1f}s")
+        self.retry_at = retry_at
+
+
+def get_session() -> requests.Session:
+    """Keep-alive session shared by the upload workers, one pooled connection per worker."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=UPLOAD_CONCURRENCY + UPLOAD_VIDEO_CONCURRENCY)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number attempt (1-based)."""
+    return random.uniform(0, min(UPLOAD_BACKOFF_MAX_S, UPLOAD_BACKOFF_BASE_S * 2 ** (attempt - 1)))
+
+def is_outage(exc: Exception) -> bool:
+    """Failures that say the node is down, not that this one request was bad."""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Stops uploads while the data node is down:
+      closed    → requests go through; UPLOAD_BREAKER_THRESHOLD outages in a row open it
+      open      → requests fail fast until the cooldown ends
+      half-open → one probe request; success closes, failure reopens with a doubled cooldown
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._cooldown = UPLOAD_BREAKER_COOLDOWN_S
+        self._opened_until = 0.0
+        self._probing = False
+        self._opened = counter("data_node_breaker_opened")
+
+    def before_request(self):
+        """Raise DataNodeDown unless a request may go out now."""
+        with self._lock:
+            now = time.time()
+            if self._failures < UPLOAD_BREAKER_THRESHOLD:
+                return
+            if now < self._opened_until or self._probing:
+                # Spread the waiting uploads over the cooldown after it ends
+                raise DataNodeDown(max(self._opened_until, now) + random.uniform(0, self._cooldown))
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self._failures >= UPLOAD_BREAKER_THRESHOLD:
+                print(f"🟢 Data node {self.name} back up")
+            self._failures = 0
+            self._cooldown = UPLOAD_BREAKER_COOLDOWN_S
+            self._probing = False
+
+    def record_failure(self, exc: Exception):
+        if not is_outage(exc):
+            # The node answered; only this request was bad
+            self.record_success()
+            return
+        with self._lock:
+            probe = self._probing
+            if probe:
+                self._cooldown = min(self._cooldown * 2, UPLOAD_BREAKER_MAX_COOLDOWN_S)
+            self._failures += 1
+            self._probing = False
+            # Requests already in flight when it opened don't extend the pause
+            if probe or self._failures == UPLOAD_BREAKER_THRESHOLD:
+                self._opened_until = time.time() + self._cooldown
+                self._opened.inc()
+                print(f"🔴 Data node {self.name} down, pausing uploads for {self._cooldown:.0f}s")
+
+    def state(self) -> dict:
+        with self._lock:
+            if self._failures < UPLOAD_BREAKER_THRESHOLD:
+                state = "closed"
+            elif self._probing or time.time() >= self._opened_until:
+                state = "half_open"
+            else:
+                state = "open"
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "cooldown_s": self._cooldown,
+                "retry_in_s": max(self._opened_until - time.time(), 0.0) if state == "open" else 0.0,
+            }
+
+
+def get_breaker(data_node_url: str) -> CircuitBreaker:
+    with _session_lock:
+        if data_node_url not in _breakers:
+            _breakers[data_node_url] = CircuitBreaker(data_node_url)
+        return _breakers[data_node_url]
+
+def breaker_stats() -> dict:
+    with _session_lock:
+        breakers = dict(_breakers)
+    return {url: breaker.state() for url, breaker in breakers.items()}
+
+def request(method: str, data_node_url: str, path: str, **kwargs) -> requests.Response:
+    """Send a request through the pooled session, guarded by the node's breaker."""
+    breaker = get_breaker(data_node_url)
+    breaker.before_request()
+    try:
+        r = get_session().request(method, f"{data_node_url}{path}", **kwargs)
+        r.raise_for_status()
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    breaker.record_success()
+    return r
+
+def post(data_node_url: str, path: str, **kwargs) -> requests.Response:
+    return request("POST", data_node_url, path, **kwargs)
+
+def get(data_node_url: str, path: str, **kwargs) -> requests.Response:
+    return request("GET", data_node_url, path, **kwargs)
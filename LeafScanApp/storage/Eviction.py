@@ -0,0 +1,20 @@
+# storage/Eviction.py
+#
+# Eviction policies: after expired jobs are dropped, each policy walks
+# its sorted sets lowest score first until the cache fits its budget.
+# Victims are tagged with the kind that picked them.
+
+# policy -> [(kind, sorted set)]
+EVICTION_POLICIES = {
+    # Least recently written first
+    "lru": [("lru", "cache:lru")],
+    # Greedy-dual size frequency: large, rarely used entries first
+    "gdsf": [("gdsf", "cache:gdsf")],
+    # Finished and uploaded jobs first, then anything idle by recency
+    "completed_first": [("completed", "cache:completed"), ("lru", "cache:lru")],
+}
+
+def get_eviction_policy(name: str) -> list:
+    if name not in EVICTION_POLICIES:
+        raise ValueError(f"Unknown eviction policy: {name}")
+    return EVICTION_POLICIES[name]
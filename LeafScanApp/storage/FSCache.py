@@ -1,13 +1,20 @@
+import os
 from pathlib import Path
 import shutil
 import uuid
 import json
-from .Cache import ComputeCache
+import threading
+from contextlib import contextmanager
+from .Cache import ComputeCache, Written
+from .Checksum import ChunkHasher, HashingReader, sha256_bytes
 
 class FileSystemComputeCache(ComputeCache):
     def __init__(self, base_dir: str):
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        # Artifacts being written in chunks -> their running checksum
+        self._chunk_hashers = {}
+        self._chunk_hashers_lock = threading.Lock()
 
     def _entry_dir(self, entry_id: str | None) -> Path:
         if entry_id is None:
@@ -17,33 +24,89 @@ class FileSystemComputeCache(ComputeCache):
     def _artifact_path(self, entry_id: str | None, artifact_name: str) -> Path:
         return self._entry_dir(entry_id) / artifact_name
 
+    def _blob_path(self, digest: str) -> Path:
+        return self.base_dir / "_blobs" / digest
+
+    def _charged_size(self, path: Path) -> int:
+        # Hardlinked blobs are accounted once through their reference count
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return 0
+        return st.st_size if st.st_nlink == 1 else 0
+
     # =======================================
     #            PUT FUNCTIONS
     # =======================================
 
-    def put(self, artifact_name: str, data: bytes, entry_id: str | None = None) -> None:
+    def put(self, artifact_name: str, data: bytes, entry_id: str | None = None) -> Written:
         entry_dir = self._entry_dir(entry_id)
         entry_dir.mkdir(parents=True, exist_ok=True)
         path = self._artifact_path(entry_id, artifact_name)
+        old_size = self._charged_size(path)
 
         tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
         tmp_path.write_bytes(data)
         tmp_path.replace(path)
+        return Written(len(data) - old_size, len(data), sha256_bytes(data))
 
-    def put_json(self, artifact_name: str, obj: dict, entry_id: str | None = None) -> None:
-        self.put(artifact_name, json.dumps(obj, indent=2).encode("utf-8"), entry_id=entry_id, atomic=True)
+    def put_json(self, artifact_name: str, obj: dict, entry_id: str | None = None) -> Written:
+        return self.put(artifact_name, json.dumps(obj, indent=2).encode("utf-8"), entry_id=entry_id)
 
-    def put_stream(self, artifact_name: str, stream, entry_id: str | None = None) -> None:
+    def put_stream(self, artifact_name: str, stream, entry_id: str | None = None) -> Written:
         entry_dir = self._entry_dir(entry_id)
         entry_dir.mkdir(parents=True, exist_ok=True)
-        with open(self._artifact_path(entry_id, artifact_name), "wb") as f:
-            shutil.copyfileobj(stream, f)
+        path = self._artifact_path(entry_id, artifact_name)
+        old_size = self._charged_size(path)
 
-    def put_chunk(self, artifact_name: str, chunk: bytes, entry_id: str | None = None):
+        # Replace atomically so readers of the old file are never truncated
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        reader = HashingReader(stream)
+        with open(tmp_path, "wb") as f:
+            shutil.copyfileobj(reader, f)
+        tmp_path.replace(path)
+        return Written(reader.size - old_size, reader.size, reader.hexdigest())
+
+    def put_chunk(self, artifact_name: str, chunk: bytes, entry_id: str | None = None, offset: int | None = None) -> int:
         path = self._artifact_path(entry_id, artifact_name)
         path.parent.mkdir(parents=True, exist_ok=True)
-        with open(path, "ab") as f:
-            f.write(chunk)
+        with self._chunk_hashers_lock:
+            hasher = self._chunk_hashers.setdefault(path, ChunkHasher())
+        if offset is None:
+            with open(path, "ab") as f:
+                start = f.tell()
+                f.write(chunk)
+            hasher.update(start, chunk)
+            return len(chunk)
+
+        # Positional write: chunks may arrive out of order, concurrently or twice
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            old_size = os.fstat(fd).st_size
+            os.pwrite(fd, chunk, offset)
+        finally:
+            os.close(fd)
+        hasher.update(offset, chunk)
+        # Only growth past the old end of file is new
+        return max(offset + len(chunk) - old_size, 0)
+
+    def move(self, src_artifact: str, dst_artifact: str, entry_id: str | None = None) -> int:
+        dst = self._artifact_path(entry_id, dst_artifact)
+        old_size = self._charged_size(dst)
+        src = self._artifact_path(entry_id, src_artifact)
+        src.replace(dst)
+        with self._chunk_hashers_lock:
+            self._chunk_hashers.pop(dst, None)
+            hasher = self._chunk_hashers.pop(src, None)
+            if hasher is not None:
+                self._chunk_hashers[dst] = hasher
+        return -old_size
+
+    def checksum(self, artifact_name: str, entry_id: str | None = None) -> str:
+        path = self._artifact_path(entry_id, artifact_name)
+        with self._chunk_hashers_lock:
+            hasher = self._chunk_hashers.pop(path, None) or ChunkHasher()
+        return hasher.finish(path)
 
     # =======================================
     #            GET FUNCTIONS
@@ -59,6 +122,14 @@ class FileSystemComputeCache(ComputeCache):
     def get_stream(self, artifact_name: str, entry_id: str | None = None):
         return open(self._artifact_path(entry_id, artifact_name), "rb")
 
+    @contextmanager
+    def local_path(self, artifact_name: str, entry_id: str | None = None):
+        # Artifacts already live on local disk; no copy needed
+        path = self._artifact_path(entry_id, artifact_name)
+        if not path.exists():
+            raise FileNotFoundError(path)
+        yield path
+
     
     # =======================================
     #            HELPER FUNCTIONS
@@ -67,21 +138,60 @@ class FileSystemComputeCache(ComputeCache):
     def exists(self, artifact_name: str, entry_id: str | None = None) -> bool:
         return self._artifact_path(entry_id, artifact_name).exists()
 
-    def delete(self, artifact_name: str | None = None, entry_id: str | None = None):
+    def artifact_path(self, artifact_name: str, entry_id: str | None = None) -> Path:
+        return self._artifact_path(entry_id, artifact_name)
+
+    def delete(self, artifact_name: str | None = None, entry_id: str | None = None) -> int:
         if artifact_name is None:
             # Delete entire entry folder
             if entry_id is None:
                 raise ValueError("entry_id must be provided when deleting an entire entry folder")
             entry_dir = self._entry_dir(entry_id)
+            size = self.compute_entry_size(entry_id)
+            with self._chunk_hashers_lock:
+                for path in [p for p in self._chunk_hashers if p.parent == entry_dir]:
+                    del self._chunk_hashers[path]
             if entry_dir.exists():
                 shutil.rmtree(entry_dir, ignore_errors=True)
+            return -size
         else:
             # Delete a single artifact (either in entry folder or base dir)
             path = self._artifact_path(entry_id, artifact_name)
+            size = self._charged_size(path)
+            with self._chunk_hashers_lock:
+                self._chunk_hashers.pop(path, None)
             if path.exists():
                 path.unlink()
+            return -size
+
+    # =======================================
+    #          CONTENT-ADDRESSED BLOBS
+    # =======================================
+
+    def dedup_blob(self, digest: str, artifact_name: str, entry_id: str | None = None) -> bool:
+        """
+        Share an artifact's bytes through the blob for its digest.
+        Returns True if an existing blob was reused (the artifact now hardlinks it),
+        False if this artifact became the blob.
+        """
+        path = self._artifact_path(entry_id, artifact_name)
+        blob = self._blob_path(digest)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, blob)
+            return False
+        except FileExistsError:
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            os.link(blob, tmp_path)
+            tmp_path.replace(path)
+            return True
+
+    def delete_blob(self, digest: str) -> None:
+        self._blob_path(digest).unlink(missing_ok=True)
 
     def clear(self) -> None:
+        with self._chunk_hashers_lock:
+            self._chunk_hashers.clear()
         for d in self.base_dir.iterdir():
             if d.is_dir():
                 shutil.rmtree(d, ignore_errors=True)
@@ -92,4 +202,4 @@ class FileSystemComputeCache(ComputeCache):
         entry_dir = self._entry_dir(entry_id)
         if not entry_dir.exists():
             return 0
-        return sum(f.stat().st_size for f in entry_dir.glob("*") if f.is_file())
+        return sum(self._charged_size(f) for f in entry_dir.glob("*") if f.is_file())
@@ -22,6 +22,20 @@ class JobFields:
     UP_SIMULATED = "up_simulated"
     UP_DEFOLIATION = "up_defoliation"
 
+    VER_ORIGINAL = "ver_original"
+    VER_SIMULATED = "ver_simulated"
+    VER_DEFOLIATION = "ver_defoliation"
+
+    SUM_VIDEO = "sum_video"
+    SUM_ORIGINAL = "sum_original"
+    SUM_SIMULATED = "sum_simulated"
+    SUM_DEFOLIATION = "sum_defoliation"
+
+    SIZE_VIDEO = "size_video"
+    SIZE_ORIGINAL = "size_original"
+    SIZE_SIMULATED = "size_simulated"
+    SIZE_DEFOLIATION = "size_defoliation"
+
     RESULT_DEFOLIATION = "defoliation_result"
     RESULT_FETCHED = "result_fetched"
 
@@ -29,6 +43,8 @@ class JobFields:
     CREATED_AT = "created_at"
     LAST_UPDATED = "last_updated"
     ARTIFACTS_PURGED = "artifacts_purged"
+    VIDEO_HASH = "video_hash"
+    CLIENT = "client"
 
 # ---- Job Schema ----
 
@@ -50,6 +66,21 @@ JOB_SCHEMA = {
     JobFields.UP_SIMULATED: 0,
     JobFields.UP_DEFOLIATION: 0,
 
+    # input versions, bumped whenever a step's inputs change
+    JobFields.VER_ORIGINAL: 0,
+    JobFields.VER_SIMULATED: 0,
+    JobFields.VER_DEFOLIATION: 0,
+
+    # artifact sha256 and size, recorded as each artifact is written
+    JobFields.SUM_VIDEO: "",
+    JobFields.SUM_ORIGINAL: "",
+    JobFields.SUM_SIMULATED: "",
+    JobFields.SUM_DEFOLIATION: "",
+    JobFields.SIZE_VIDEO: 0,
+    JobFields.SIZE_ORIGINAL: 0,
+    JobFields.SIZE_SIMULATED: 0,
+    JobFields.SIZE_DEFOLIATION: 0,
+
     # result
     JobFields.RESULT_DEFOLIATION: -1,
     JobFields.RESULT_FETCHED: 0,
@@ -57,5 +88,7 @@ JOB_SCHEMA = {
     # bookkeeping
     JobFields.BYTES: 0,
     JobFields.ARTIFACTS_PURGED: 0,
+    JobFields.VIDEO_HASH: "",
+    JobFields.CLIENT: "",
     # timestamps filled at runtime
 }
\ No newline at end of file
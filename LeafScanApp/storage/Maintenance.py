@@ -0,0 +1,36 @@
+from core.scheduler import maintenance_scheduler
+from config.storage import BYTES_RECONCILE_INTERVAL_S, EXPIRED_SWEEP_INTERVAL_S
+from .CacheMetaStore import get_meta_store
+
+
+def reconcile_bytes():
+    return get_meta_store().reconcile_bytes()
+
+def sweep_expired():
+    meta = get_meta_store()
+    meta.sweep_expired()
+    meta.sweep_abandoned_uploads()
+    # Also catch up if writers pushed the cache over the high watermark
+    meta.evict_jobs_for_space()
+
+def schedule_maintenance():
+    """Periodic background jobs that keep the meta store honest."""
+    jobs = [
+        maintenance_scheduler.add_job(
+            func=sweep_expired,
+            trigger="interval",
+            seconds=EXPIRED_SWEEP_INTERVAL_S,
+            id="sweep_expired",
+            replace_existing=True
+        ),
+        maintenance_scheduler.add_job(
+            func=reconcile_bytes,
+            trigger="interval",
+            seconds=BYTES_RECONCILE_INTERVAL_S,
+            id="reconcile_bytes",
+            replace_existing=True
+        ),
+    ]
+    for job in jobs:
+        print(f"Scheduled Maintenance Job -> {job.id}")
+    return jobs
@@ -0,0 +1,208 @@
+# storage/MetaScripts.py
+#
+# Lua scripts run server-side by CacheMetaStore so that byte accounting
+# and victim selection are atomic across inference and upload threads.
+
+# KEYS: job hash, cache:bytes, cache:total_bytes
+# ARGV: entry_id, bytes field, new size
+# Returns the delta applied to cache:total_bytes
+SET_ENTRY_BYTES = """
+local new = tonumber(ARGV[3])
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[2]) or 0) or 0
+redis.call('HSET', KEYS[1], ARGV[2], new)
+redis.call('ZADD', KEYS[2], new, ARGV[1])
+if new ~= old then
+    redis.call('INCRBY', KEYS[3], new - old)
+end
+return new - old
+"""
+
+# KEYS: job hash, cache:bytes, cache:total_bytes
+# ARGV: entry_id, bytes field, artifacts purged field
+# Returns the bytes freed (0 if nothing was charged to the entry)
+PURGE_ENTRY_BYTES = """
+local size = tonumber(redis.call('HGET', KEYS[1], ARGV[2]) or 0) or 0
+if size == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], 0, ARGV[3], 1)
+redis.call('ZADD', KEYS[2], 0, ARGV[1])
+redis.call('DECRBY', KEYS[3], size)
+return size
+"""
+
+# KEYS: cas:refs, cas:bytes, cache:total_bytes
+# ARGV: digest, size
+# Returns {refs, bytes charged}; a blob is charged on its first reference
+ADD_BLOB_REF = """
+local refs = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+if refs == 1 then
+    redis.call('INCRBY', KEYS[3], ARGV[2])
+    return {refs, tonumber(ARGV[2])}
+end
+return {refs, 0}
+"""
+
+# KEYS: cas:refs, cas:bytes, cache:total_bytes
+# ARGV: digest
+# Returns {refs, bytes freed}; bytes are freed with the last reference
+RELEASE_BLOB_REF = """
+local refs = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+if refs > 0 then
+    return {refs, 0}
+end
+local size = 0
+if refs == 0 then
+    size = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or 0) or 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('DECRBY', KEYS[3], size)
+return {refs, size}
+"""
+
+# KEYS: cache:total_bytes, cache:bytes, cas:refs, cas:bytes
+# Rebuilds the total from per-entry bytes plus referenced blobs.
+# Returns the correction applied to cache:total_bytes
+RECONCILE_TOTAL = """
+local expected = 0
+local entries = redis.call('ZRANGE', KEYS[2], 0, -1, 'WITHSCORES')
+for i = 2, #entries, 2 do
+    expected = expected + tonumber(entries[i])
+end
+local blobs = redis.call('HGETALL', KEYS[4])
+for i = 1, #blobs, 2 do
+    if (tonumber(redis.call('HGET', KEYS[3], blobs[i]) or 0) or 0) > 0 then
+        expected = expected + tonumber(blobs[i + 1])
+    end
+end
+local total = tonumber(redis.call('GET', KEYS[1]) or 0) or 0
+redis.call('SET', KEYS[1], expected)
+return expected - total
+"""
+
+# KEYS: job hash, cache:lru, cache:freq, cache:bytes, cache:gdsf, cache:gdsf_clock
+# ARGV: entry_id, now, last updated field
+# Refreshes recency after a write, and the GDSF priority
+# clock + (fetches + 1) / size for the entry's new size
+TOUCH_ENTRY = """
+redis.call('HSET', KEYS[1], ARGV[3], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+local hits = tonumber(redis.call('ZSCORE', KEYS[3], ARGV[1]) or 0) or 0
+local size = tonumber(redis.call('ZSCORE', KEYS[4], ARGV[1]) or 0) or 0
+local clock = tonumber(redis.call('GET', KEYS[6]) or 0) or 0
+redis.call('ZADD', KEYS[5], clock + (hits + 1) / math.max(size, 1), ARGV[1])
+"""
+
+# KEYS: cache:freq, cache:bytes, cache:gdsf, cache:gdsf_clock
+# ARGV: entry_id
+# Counts one fetch of the entry's results and raises its GDSF priority,
+# so entries clients keep reading outrank ones only ever written
+RECORD_FETCH = """
+local hits = tonumber(redis.call('ZINCRBY', KEYS[1], 1, ARGV[1]))
+local size = tonumber(redis.call('ZSCORE', KEYS[2], ARGV[1]) or 0) or 0
+local clock = tonumber(redis.call('GET', KEYS[4]) or 0) or 0
+redis.call('ZADD', KEYS[3], clock + (hits + 1) / math.max(size, 1), ARGV[1])
+"""
+
+# KEYS: job hash
+# ARGV: stage flag, claim field, version field, <upstream flags...>
+# Returns 1 if the stage is now claimed for dispatch: every upstream flag
+# is set, the stage's own flag is not, and nobody claimed it yet for its
+# current input version
+CLAIM_STAGE = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == '1' then
+    return 0
+end
+for i = 4, #ARGV do
+    if redis.call('HGET', KEYS[1], ARGV[i]) ~= '1' then
+        return 0
+    end
+end
+local version = redis.call('HGET', KEYS[1], ARGV[3]) or '0'
+if redis.call('HGET', KEYS[1], ARGV[2]) == version then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], version)
+return 1
+"""
+
+# KEYS: cache:total_bytes, cache:max_bytes, cache:evicting, cas:refs,
+#       cas:bytes, cache:completed, cache:gdsf_clock, source set,
+#       <job hash per candidate...>
+# ARGV: now, bytes field, video hash field, claim ttl, target fraction,
+#       max victims, kind, n candidates, <candidate entry ids...>,
+#       <protected flag per candidate...>
+# Returns {under_target, examined, entry_id, entry_id, ...}
+#
+# Candidates are one window of the source set, read by the caller lowest
+# score first. Expired candidates are picked whatever the total; ranked
+# ones only until the projected total fits target * max bytes. At most
+# max victims are picked per call; examined says how far into the window
+# the call got. Protected entries (jobs queued or running) are skipped.
+# Picked entries are claimed in cache:evicting so a concurrent pass never
+# picks the same victim twice.
+PICK_EVICTION_VICTIMS = """
+local now = tonumber(ARGV[1])
+local total = tonumber(redis.call('GET', KEYS[1]) or 0) or 0
+local max_bytes = tonumber(redis.call('GET', KEYS[2]) or 0) or 0
+local target = max_bytes * tonumber(ARGV[5])
+local max_victims = tonumber(ARGV[6])
+local kind = ARGV[7]
+local n = tonumber(ARGV[8])
+
+-- Claims left by a pass that died before purging run out
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now - tonumber(ARGV[4]))
+
+local function freed(job)
+    local fields = redis.call('HMGET', job, ARGV[2], ARGV[3])
+    local size = tonumber(fields[1] or 0) or 0
+    local digest = fields[2]
+    -- Shared video bytes only come back with the last reference
+    if digest and digest ~= '' and tonumber(redis.call('HGET', KEYS[4], digest) or 0) == 1 then
+        size = size + (tonumber(redis.call('HGET', KEYS[5], digest) or 0) or 0)
+    end
+    return size
+end
+
+local victims = {0, 0}
+local picked = 0
+local examined = 0
+
+for i = 1, n do
+    if picked >= max_victims or (kind ~= 'expired' and total <= target) then
+        break
+    end
+    examined = i
+    local entry_id = ARGV[8 + i]
+    local score = redis.call('ZSCORE', KEYS[8], entry_id)
+    local eligible = ARGV[8 + n + i] ~= '1' and score
+        and not redis.call('ZSCORE', KEYS[3], entry_id)
+    if eligible and kind == 'expired' and tonumber(score) > now then
+        eligible = false
+    end
+    if eligible then
+        local size = freed(KEYS[8 + i])
+        if kind == 'expired' or size > 0 then
+            total = total - size
+            picked = picked + 1
+            redis.call('ZADD', KEYS[3], now, entry_id)
+            redis.call('ZREM', KEYS[6], entry_id)
+            if kind == 'expired' then
+                redis.call('ZREM', KEYS[8], entry_id)
+            elseif kind == 'gdsf' then
+                -- Inflate the clock so surviving entries age relative to the victim
+                redis.call('SET', KEYS[7], score)
+            end
+            table.insert(victims, entry_id)
+        end
+    end
+end
+
+if total <= target then
+    victims[1] = 1
+end
+victims[2] = examined
+return victims
+"""
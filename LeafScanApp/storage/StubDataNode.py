@@ -0,0 +1,264 @@
+"""
+Local stand-in for the data node, for exercising uploads without the real one.
+
+    python -m storage.StubDataNode --port 8000
+
+then point DATA_STORE_URL at http://127.0.0.1:8000. It accepts /upload,
+/upload/batch (multipart, one part per artifact), /upload/range (GET the
+bytes held, POST a Content-Range) and /reset like the data node, rejecting
+uploads that do not match their X-Checksum-SHA256 header, and POST /faults
+injects failures:
+    {"fail": 3, "status": 503}   next 3 uploads answer 503
+    {"down_s": 60}               refuse uploads (503) for 60 seconds
+    {"delay_s": 2}               hold every upload 2 seconds
+    {"no_batch": true}           answer 404 on /upload/batch, like an older node
+    {"no_range": true}           answer 404 on /upload/range, likewise
+    {"cut_after": 1000}          drop the connection 1000 bytes into the next range
+    {}                           clear all faults
+GET /stats reports uploads received, batches, ranges, failures served and connections opened.
+"""
+import argparse
+import hashlib
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+
+class StubDataNode(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, root: Path):
+        super().__init__(address, _Handler)
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.faults = {}
+        self.stats = {"uploads": 0, "batches": 0, "ranges": 0, "failed": 0, "connections": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_failure(self):
+        """Status code the next upload should fail with, or None."""
+        with self.lock:
+            if self.faults.get("down_until", 0) > time.time():
+                return 503
+            if self.faults.get("fail", 0) > 0:
+                self.faults["fail"] -= 1
+                return self.faults.get("status", 503)
+            return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real node
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def _range_target(self, query: dict = None) -> Path:
+        if query is None:
+            video_id, artifact, ext = (self.headers.get(h) for h in ("X-Video-ID", "X-Artifact", "X-Ext"))
+        else:
+            video_id, artifact, ext = (query.get(k, [""])[0] for k in ("video_id", "artifact", "ext"))
+        return self.server.root / f"{video_id}_{artifact}.{ext}"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            with self.server.lock:
+                return self._reply(200, dict(self.server.stats))
+        if url.path == "/upload/range":
+            if self.server.faults.get("no_range"):
+                return self._reply(404, {"error": "not found"})
+            path = self._range_target(parse_qs(url.query))
+            return self._reply(200, {"received": path.stat().st_size if path.exists() else 0})
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        server = self.server
+        if self.path == "/upload":
+            return self._upload()
+        if self.path == "/upload/batch":
+            return self._upload_batch()
+        if self.path == "/upload/range":
+            return self._upload_range()
+        if self.path == "/reset":
+            b"".join(self._read_body())
+            shutil.rmtree(server.root, ignore_errors=True)
+            server.root.mkdir(parents=True, exist_ok=True)
+            return self._reply(200, {"status": "success"})
+        if self.path == "/faults":
+            faults = json.loads(b"".join(self._read_body()) or b"{}")
+            if "down_s" in faults:
+                faults["down_until"] = time.time() + float(faults.pop("down_s"))
+            with server.lock:
+                server.faults = faults
+            return self._reply(200, {"faults": faults})
+        self._reply(404, {"error": "not found"})
+
+    def _upload(self):
+        server = self.server
+        delay = server.faults.get("delay_s", 0)
+        if delay:
+            time.sleep(delay)
+
+        status = server.next_failure()
+        if status:
+            # Drain the body so the connection stays usable
+            for _ in self._read_body():
+                pass
+            with server.lock:
+                server.stats["failed"] += 1
+            return self._reply(status, {"error": "injected failure"})
+
+        name = f"{self.headers.get('X-Video-ID')}_{self.headers.get('X-Artifact')}.{self.headers.get('X-Ext')}"
+        h = hashlib.sha256()
+        with open(server.root / name, "wb") as f:
+            for chunk in self._read_body():
+                h.update(chunk)
+                f.write(chunk)
+        expected = self.headers.get("X-Checksum-SHA256")
+        if expected and expected != h.hexdigest():
+            with server.lock:
+                server.stats["failed"] += 1
+            return self._reply(422, {"error": "checksum mismatch", "checksum": h.hexdigest()})
+        with server.lock:
+            server.stats["uploads"] += 1
+        self._reply(200, {"status": "success", "checksum": h.hexdigest()})
+
+    def _upload_range(self):
+        """Bytes start-end/total at start <= bytes held; the last range is checked against X-Checksum-SHA256."""
+        server = self.server
+        status = server.next_failure()
+        if status:
+            for _ in self._read_body():
+                pass
+            with server.lock:
+                server.stats["failed"] += 1
+            return self._reply(status, {"error": "injected failure"})
+
+        start, end, total = (int(x) for x in re.match(r"bytes (\d+)-(\d+)/(\d+)", self.headers["Content-Range"]).groups())
+        path = self._range_target()
+        held = path.stat().st_size if path.exists() else 0
+        if start > held:
+            for _ in self._read_body():
+                pass
+            return self._reply(409, {"error": "gap before range", "received": held})
+
+        cut = server.faults.get("cut_after")
+        with open(path, "r+b" if path.exists() else "wb") as f:
+            f.seek(start)
+            f.truncate()
+            for chunk in self._read_body():
+                if cut is not None and f.tell() - start + len(chunk) > cut:
+                    # Simulate the link dropping mid-range
+                    f.write(chunk[:max(cut - (f.tell() - start), 0)])
+                    with server.lock:
+                        server.faults.pop("cut_after", None)
+                        server.stats["failed"] += 1
+                    self.close_connection = True
+                    return
+                f.write(chunk)
+            received = f.tell()
+
+        with server.lock:
+            server.stats["ranges"] += 1
+        if received < total:
+            return self._reply(200, {"received": received})
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        expected = self.headers.get("X-Checksum-SHA256")
+        if expected and expected != h.hexdigest():
+            path.unlink()
+            with server.lock:
+                server.stats["failed"] += 1
+            return self._reply(422, {"error": "checksum mismatch", "checksum": h.hexdigest()})
+        with server.lock:
+            server.stats["uploads"] += 1
+        self._reply(200, {"received": received, "checksum": h.hexdigest()})
+
+    def _upload_batch(self):
+        server = self.server
+        body = b"".join(self._read_body())
+        if server.faults.get("no_batch"):
+            return self._reply(404, {"error": "not found"})
+        status = server.next_failure()
+        if status:
+            with server.lock:
+                server.stats["failed"] += 1
+            return self._reply(status, {"error": "injected failure"})
+
+        message = BytesParser(policy=default).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode() + body
+        )
+        results = []
+        for part in message.iter_parts():
+            data = part.get_payload(decode=True) or b""
+            video_id, artifact = part.get("X-Video-ID"), part.get("X-Artifact")
+            digest = hashlib.sha256(data).hexdigest()
+            result = {"video_id": video_id, "artifact": artifact, "checksum": digest}
+            if part.get("X-Checksum-SHA256") not in (None, digest):
+                result["status"] = "checksum mismatch"
+            else:
+                (server.root / f"{video_id}_{artifact}.{part.get('X-Ext')}").write_bytes(data)
+                result["status"] = "success"
+            results.append(result)
+        with server.lock:
+            server.stats["batches"] += 1
+            server.stats["uploads"] += sum(r["status"] == "success" for r in results)
+        self._reply(200, {"results": results})
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0, root: Path = None) -> StubDataNode:
+    """Serve a stub data node from a background thread; port 0 picks a free one."""
+    server = StubDataNode((host, port), root or tempfile.mkdtemp(prefix="stub_data_node_"))
+    threading.Thread(target=server.serve_forever, name="stub-data-node", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub data node")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--root", default="/tmp/leafscan/stub_data_node")
+    args = parser.parse_args()
+
+    server = StubDataNode((args.host, args.port), args.root)
+    print(f"🧪 Stub data node on {server.url}, storing in {server.root}")
+    server.serve_forever()
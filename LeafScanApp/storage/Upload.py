@@ -1,82 +1,490 @@
-import requests
 import hashlib
+import os
+import threading
 import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timedelta
 from pathlib import Path
 
-from core.scheduler import upload_scheduler
-from config.storage import DATA_STORE_URL
+import requests
+from apscheduler.jobstores.base import ConflictingIdError
+
+from core.metrics import counter
+from core.scheduler import (
+    upload_scheduler, upload_jobstore, queued_count, track_running, register_active_source, register_job_ids
+)
+from config.storage import (
+    DATA_STORE_URL, UPLOAD_MAX_ATTEMPTS, UPLOAD_TIMEOUT_S,
+    UPLOAD_BATCH_MAX_BYTES, UPLOAD_BATCH_WINDOW_S, UPLOAD_BATCH_MAX_ITEMS,
+    UPLOAD_TRANSFER_BPS, UPLOAD_RANGED_MIN_BYTES, UPLOAD_CHUNK_BYTES,
+)
 from .CacheMetaStore import get_meta_store
+from . import DataNode as data_node
+from .DataNode import DataNodeDown, backoff
+from .Bandwidth import RESULTS, VIDEOS, ThrottledReader, upload_limiter
 from .Artifacts import ARTIFACTS
+from .JobSchema import JobTypes
+
+# upload_{entry_id}_{step}; batch jobs carry no single entry (see _batch_entries)
+register_job_ids("upload_", [f"_{step}" for step in ARTIFACTS])
 
 
 def schedule_upload(entry_id: str, step: str, local_path: Path):
-    job = upload_scheduler.add_job(
+    if _batchable(step, local_path, DATA_STORE_URL):
+        return _queue_batched(entry_id, step, local_path, DATA_STORE_URL)
+
+    _track_queued(entry_id, step, local_path)
+    job_id = f"upload_{entry_id}_{step}"
+    while True:
+        try:
+            job = upload_scheduler.add_job(
+                func=upload_with_mark,
+                args=[entry_id, step, local_path, DATA_STORE_URL],
+                id=job_id,
+                executor=_executor(step),
+                replace_existing=False
+            )
+            break
+        except ConflictingIdError:
+            # Already queued, or a retry is waiting out its backoff;
+            # either way it sends the file as it is when it runs
+            job = upload_scheduler.get_job(job_id)
+            if job:
+                break
+        # Handed to a worker in between; queue a fresh run for the new file
+    queue_size = queued_count(upload_jobstore) - 1
+    print(f"Queued Upload Job -> {job.id}")
+    return job, queue_size
+
+def _retry_upload(entry_id: str, step: str, local_path: Path, data_node_url: str, attempt: int, delay: float):
+    # At least a second out: this run must finish before the same job id is due again
+    run_date = datetime.now() + timedelta(seconds=max(delay, 1.0))
+    _track_queued(entry_id, step, local_path)
+    upload_scheduler.add_job(
         func=upload_with_mark,
-        args=[entry_id, step, local_path, DATA_STORE_URL],
+        trigger="date",
+        run_date=run_date,
+        args=[entry_id, step, local_path, data_node_url, attempt],
         id=f"upload_{entry_id}_{step}",
-        replace_existing=False
+        executor=_executor(step),
+        replace_existing=True
     )
-    queue_size = len(upload_scheduler.get_jobs()) - 1
-    print(f"Queued Upload Job -> {job.id}")
-    return job, queue_size
 
-def upload_with_mark(entry_id: str, step: str, local_path: Path, data_node_url: str, max_attempts: int=10):
-    upload_successful = upload_with_retry(entry_id, step, local_path, data_node_url, max_attempts)
+def _upload_class(step: str) -> int:
+    return VIDEOS if step == JobTypes.VIDEO else RESULTS
+
+def _executor(step: str) -> str:
+    # Videos have their own workers; results never wait for one to free up
+    return "video" if step == JobTypes.VIDEO else "default"
+
+# ----------------------------
+# Upload backlog, in bytes
+# ----------------------------
 
-    if upload_successful:
-        meta = get_meta_store()
-        meta.update_field(entry_id, ARTIFACTS[step].upload_flag)
-        meta.finalize_job_if_complete(entry_id)
+# upload job id -> (class, bytes) for single uploads waiting to start
+_queued_bytes = {}
+# upload job id -> bytes not yet sent, for transfers in progress
+_in_flight = {}
+_backlog_lock = threading.Lock()
 
+def _track_queued(entry_id: str, step: str, local_path: Path):
+    try:
+        size = os.path.getsize(local_path)
+    except OSError:
+        size = 0
+    with _backlog_lock:
+        _queued_bytes[f"upload_{entry_id}_{step}"] = (_upload_class(step), size)
+
+def upload_stats() -> dict:
+    """Upload backlog and throughput in bytes, for this process."""
+    with _batch_lock:
+        batched = [local_path for local_path, _ in _batch.values()]
+    batched_bytes = 0
+    for local_path in batched:
+        try:
+            batched_bytes += os.path.getsize(local_path)
+        except OSError:
+            pass
+    with _backlog_lock:
+        queued = list(_queued_bytes.values())
+        in_flight = sum(_in_flight.values())
+
+    return {
+        "backlog_bytes": {
+            "results": batched_bytes + sum(size for cls, size in queued if cls == RESULTS),
+            "videos": sum(size for cls, size in queued if cls == VIDEOS),
+            "in_flight": in_flight,
+        },
+        "transfer_cap_bps": UPLOAD_TRANSFER_BPS or None,
+        **upload_limiter.stats(),
+    }
+
+def upload_with_mark(entry_id: str, step: str, local_path: Path, data_node_url: str, attempt: int = 1):
+    """
+    One upload attempt. A failed attempt frees the worker and comes back as a
+    timed job after a jittered backoff; while the data node's breaker is open,
+    uploads wait for it without spending attempts. Large files resume from
+    the last chunk the data node acknowledged.
+    """
+    job_id = f"upload_{entry_id}_{step}"
+    with _backlog_lock:
+        _queued_bytes.pop(job_id, None)
+    try:
+        with track_running(entry_id):
+            upload_attempt(entry_id, step, local_path, data_node_url)
+    except DataNodeDown as e:
+        _retry_upload(entry_id, step, local_path, data_node_url, attempt, e.retry_at - time.time())
+        return False
+    except UploadInterrupted as e:
+        # Some chunks landed: resume soon, without spending an attempt
+        print(f"⏸️ Upload {entry_id}_{step} interrupted at {e.received} bytes, resuming: {e}")
+        _retry_upload(entry_id, step, local_path, data_node_url, attempt, backoff(1))
+        return False
+    except Exception as e:
+        if attempt >= UPLOAD_MAX_ATTEMPTS:
+            print(f"❌ Upload {entry_id}_{step} failed after {attempt} attempts: {e}")
+            return False
+        delay = backoff(attempt)
+        print(f"⏳ Upload retry {attempt}/{UPLOAD_MAX_ATTEMPTS} for {entry_id}_{step} in {delay:.1f}s: {e}")
+        _retry_upload(entry_id, step, local_path, data_node_url, attempt + 1, delay)
+        return False
+
+    _mark_uploaded([(entry_id, step)])
+    return True
+
+def _mark_uploaded(uploaded):
+    """Flag each uploaded (entry_id, step); one meta round trip for all of them."""
+    meta = get_meta_store()
+    with meta.batch():
+        for entry_id, step in uploaded:
+            meta.update_field(entry_id, ARTIFACTS[step].upload_flag)
+        for entry_id in dict.fromkeys(entry_id for entry_id, _ in uploaded):
+            meta.finalize_job_if_complete(entry_id)
+
+    for entry_id, step in uploaded:
         print(f">>> Upload {entry_id}_{step} >>>>")
         print(meta.get_entry(entry_id))
         print(f"<<<< Upload {entry_id}_{step} <<<<")
         print()
 
-        return True
-    return False
+class ChecksumMismatch(Exception):
+    """The data node stored different bytes than the ones sent, or did not say what it stored."""
+
+
+def _artifact_checksum(entry_id: str, step: str, local_path: Path) -> str:
+    """The checksum recorded when the artifact was written, hashed again only if it is missing or stale."""
+    artifact = ARTIFACTS[step]
+    meta = get_meta_store()
+    fields = meta.get_fields(entry_id, artifact.checksum_field, artifact.size_field)
+    digest = fields[artifact.checksum_field]
+    if digest and int(fields[artifact.size_field] or 0) == os.path.getsize(local_path):
+        return digest
+
+    # Written before checksums were recorded, or rewritten since
+    digest = sha256(local_path)
+    with meta.batch():
+        meta.update_field(entry_id, artifact.checksum_field, digest)
+        meta.update_field(entry_id, artifact.size_field, os.path.getsize(local_path))
+    return digest
+
+class UploadInterrupted(Exception):
+    """A ranged upload failed after the data node acknowledged some of it."""
+
+    def __init__(self, message, received: int):
+        super().__init__(message)
+        self.received = received
 
-def upload_with_retry(entry_id: str, step: str, local_path: Path, data_node_url: str, max_attempts: int = 10):
-    upload_url = f"{data_node_url}/upload"
-    compute_checksum = sha256(local_path)
 
-    ext = "json"
-    if step == "video":
-        ext = "mp4"
+# data node urls without /upload/range
+_no_range_endpoint = set()
+# upload job ids whose next ranged attempt starts over at byte 0
+_restart_ranged = set()
 
-    headers = {
+def _upload_headers(entry_id: str, step: str, checksum: str) -> dict:
+    return {
         "Content-Type": "application/octet-stream",
         "X-Video-ID": entry_id,
         "X-Artifact": step,
-        "X-Ext": ext,
+        "X-Ext": "mp4" if step == JobTypes.VIDEO else "json",
+        "X-Checksum-SHA256": checksum,
     }
 
-    for attempt in range(1, max_attempts + 1):
-        try:
-            # Upload
+def _set_in_flight(job_id: str, remaining: int):
+    with _backlog_lock:
+        _in_flight[job_id] = remaining
+
+def _throttled(f, length: int, step: str, job_id: str) -> ThrottledReader:
+    def sent(n):
+        with _backlog_lock:
+            _in_flight[job_id] = _in_flight.get(job_id, 0) - n
+    return ThrottledReader(f, length, upload_limiter, UPLOAD_TRANSFER_BPS, _upload_class(step), sent)
+
+def upload_attempt(entry_id: str, step: str, local_path: Path, data_node_url: str):
+    compute_checksum = _artifact_checksum(entry_id, step, local_path)
+    headers = _upload_headers(entry_id, step, compute_checksum)
+    size = os.path.getsize(local_path)
+    job_id = f"upload_{entry_id}_{step}"
+    _set_in_flight(job_id, size)
+
+    try:
+        if size >= UPLOAD_RANGED_MIN_BYTES and data_node_url not in _no_range_endpoint:
+            data_checksum = _upload_ranged(local_path, size, headers, data_node_url, job_id)
+        else:
+            # Upload over a pooled keep-alive connection
             with open(local_path, "rb") as f:
-                r = requests.post(
-                    upload_url,
-                    data=f,
+                r = data_node.post(
+                    data_node_url,
+                    "/upload",
+                    data=_throttled(f, size, step, job_id),
                     headers=headers,
-                    timeout=120,
+                    timeout=UPLOAD_TIMEOUT_S,
                 )
-                r.raise_for_status()
-
-            # Optional: trust server checksum if you want
             data_checksum = r.json().get("checksum")
+    finally:
+        with _backlog_lock:
+            _in_flight.pop(job_id, None)
+
+    if data_checksum != compute_checksum:
+        # Resuming would only complete the same bad (or unconfirmed) copy
+        _restart_ranged.add(job_id)
+        if data_checksum is None:
+            raise ChecksumMismatch(f"data node sent no checksum, sent {compute_checksum[:12]}")
+        raise ChecksumMismatch(f"data node has {data_checksum[:12]}, sent {compute_checksum[:12]}")
+    print(f"✅ Upload verified: {entry_id}_{step}")
+
+def _upload_ranged(local_path: Path, size: int, headers: dict, data_node_url: str, job_id: str):
+    """
+    Send local_path in UPLOAD_CHUNK_BYTES ranges, starting after what the
+    data node already holds. Returns the data node's checksum of the whole file.
+    """
+    target = {"video_id": headers["X-Video-ID"], "artifact": headers["X-Artifact"], "ext": headers["X-Ext"]}
+    try:
+        received = data_node.get(data_node_url, "/upload/range", params=target, timeout=UPLOAD_TIMEOUT_S).json()["received"]
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code not in (404, 405):
+            raise
+        print(f"⚠️ {data_node_url} has no ranged upload endpoint, sending whole files")
+        _no_range_endpoint.add(data_node_url)
+        with open(local_path, "rb") as f:
+            r = data_node.post(data_node_url, "/upload", data=_throttled(f, size, headers["X-Artifact"], job_id),
+                               headers=headers, timeout=UPLOAD_TIMEOUT_S)
+        return r.json().get("checksum")
+
+    # A node holding all of it still owes us the final checksum: resend the last byte
+    offset = min(received, size - 1)
+    if job_id in _restart_ranged:
+        _restart_ranged.discard(job_id)
+        offset = 0
+    _set_in_flight(job_id, size - offset)
+    if offset:
+        print(f"⏩ Resuming {job_id} at {offset}/{size} bytes")
+    acknowledged = 0
+    with open(local_path, "rb") as f:
+        while True:
+            end = min(offset + UPLOAD_CHUNK_BYTES, size)
+            f.seek(offset)
+            try:
+                r = data_node.post(
+                    data_node_url,
+                    "/upload/range",
+                    data=_throttled(f, end - offset, headers["X-Artifact"], job_id),
+                    headers={**headers, "Content-Range": f"bytes {offset}-{end - 1}/{size}"},
+                    timeout=UPLOAD_TIMEOUT_S,
+                )
+            except DataNodeDown:
+                raise
+            except Exception as e:
+                if acknowledged:
+                    raise UploadInterrupted(str(e), offset) from e
+                raise
+            body = r.json()
+            offset = body["received"]
+            _set_in_flight(job_id, size - offset)
+            acknowledged += 1
+            if offset >= size:
+                return body.get("checksum")
+
+# ----------------------------
+# Batched small artifacts
+# ----------------------------
+
+# (entry_id, step) -> (local_path, attempt), waiting for the next batch
+_batch = {}
+_batch_lock = threading.Lock()
+_flush_at = None                 # time.time() of the next scheduled flush, if any
+_no_batch_endpoint = set()       # data node urls without /upload/batch
+_batches_sent = counter("upload_batches")
+_batched_items = counter("upload_batch_items")
+
+def _batch_entries() -> set:
+    with _batch_lock:
+        return {entry_id for entry_id, _ in _batch}
+
+register_active_source(_batch_entries)
+
+def _batchable(step: str, local_path: Path, data_node_url: str) -> bool:
+    # Videos keep their own streaming request
+    if step == JobTypes.VIDEO or data_node_url in _no_batch_endpoint:
+        return False
+    try:
+        return os.path.getsize(local_path) <= UPLOAD_BATCH_MAX_BYTES
+    except OSError:
+        return False
+
+def _queue_batched(entry_id: str, step: str, local_path: Path, data_node_url: str, attempt: int = 1, delay: float = None):
+    """Hold an artifact for the next batch; the first one in opens the window."""
+    with _batch_lock:
+        if (entry_id, step) not in _batch:
+            _batch[(entry_id, step)] = (local_path, attempt)
+            # Held in Redis too until its batch settles, like a queued upload job
+            get_meta_store().hold_batched(entry_id, step, local_path, attempt)
+        waiting = len(_batch)
+    if delay is None:
+        delay = 0 if waiting >= UPLOAD_BATCH_MAX_ITEMS else UPLOAD_BATCH_WINDOW_S
+    print(f"Batched Upload -> upload_{entry_id}_{step} ({waiting} waiting)")
+    return _schedule_flush(data_node_url, delay), waiting - 1
+
+def _schedule_flush(data_node_url: str, delay: float):
+    """Make sure a flush runs within delay seconds. Returns the new flush job, if one was needed."""
+    global _flush_at
+    run_at = time.time() + delay
+    with _batch_lock:
+        if _flush_at is not None and _flush_at <= run_at:
+            return None
+        _flush_at = run_at
+    # Each flush has its own id: one may come due while another is still sending
+    return upload_scheduler.add_job(
+        func=flush_upload_batch,
+        trigger="date",
+        run_date=datetime.fromtimestamp(run_at),
+        args=[data_node_url],
+        id=f"upload_batch_{uuid.uuid4().hex[:12]}",
+    )
+
+def flush_upload_batch(data_node_url: str):
+    """
+    Send up to UPLOAD_BATCH_MAX_ITEMS waiting artifacts in one multipart
+    request and flag each one the data node verified. Items it did not
+    verify, and whole batches that failed, wait for a later batch with
+    their own attempt counts.
+    """
+    global _flush_at
+    with _batch_lock:
+        _flush_at = None
+        keys = list(_batch)[:UPLOAD_BATCH_MAX_ITEMS]
+        items = [(entry_id, step, *_batch.pop((entry_id, step))) for entry_id, step in keys]
+        more = bool(_batch)
+    if more:
+        _schedule_flush(data_node_url, 0)
+    if not items:
+        return
+
+    if data_node_url in _no_batch_endpoint:
+        for entry_id, step, local_path, attempt in items:
+            _retry_upload(entry_id, step, local_path, data_node_url, attempt, 0)
+        _release_batched(items)
+        return
+
+    try:
+        with ExitStack() as running:
+            for entry_id in dict.fromkeys(item[0] for item in items):
+                running.enter_context(track_running(entry_id))
+            verified = upload_batch_attempt(items, data_node_url)
+    except DataNodeDown as e:
+        for entry_id, step, local_path, attempt in items:
+            _queue_batched(entry_id, step, local_path, data_node_url, attempt, e.retry_at - time.time())
+        return
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code in (404, 405):
+            # An older data node: everything goes one artifact per request
+            print(f"⚠️ {data_node_url} has no batch upload endpoint, uploading one by one")
+            _no_batch_endpoint.add(data_node_url)
+            for entry_id, step, local_path, attempt in items:
+                _retry_upload(entry_id, step, local_path, data_node_url, attempt, 0)
+            _release_batched(items)
+            return
+        verified, error = set(), e
+    except Exception as e:
+        verified, error = set(), e
+    else:
+        error = "not verified by the data node"
+
+    _batches_sent.inc()
+    _batched_items.inc(len(verified))
+    _mark_uploaded([(entry_id, step) for entry_id, step, _, _ in items if (entry_id, step) in verified])
+
+    settled = [item for item in items if (item[0], item[1]) in verified]
+    for entry_id, step, local_path, attempt in items:
+        if (entry_id, step) in verified:
+            continue
+        if attempt >= UPLOAD_MAX_ATTEMPTS:
+            print(f"❌ Upload {entry_id}_{step} failed after {attempt} attempts: {error}")
+            settled.append((entry_id, step, local_path, attempt))
+            continue
+        delay = backoff(attempt)
+        print(f"⏳ Upload retry {attempt}/{UPLOAD_MAX_ATTEMPTS} for {entry_id}_{step} in {delay:.1f}s: {error}")
+        _queue_batched(entry_id, step, local_path, data_node_url, attempt + 1, delay)
+    _release_batched(settled)
+
+def _release_batched(items):
+    get_meta_store().release_batched([(entry_id, step) for entry_id, step, _, _ in items])
+
+def restore_upload_batch(data_node_url: str = DATA_STORE_URL) -> int:
+    """
+    Put artifacts that were waiting for a batch when the process stopped
+    back in the batch, with their attempt counts. Called once at startup,
+    before recovery resubmits anything. Returns the artifacts restored.
+    """
+    held = []
+    gone = []
+    for entry_id, step, local_path, attempt in get_meta_store().held_batched():
+        if os.path.exists(local_path):
+            held.append((entry_id, step, Path(local_path), attempt))
+        else:
+            gone.append((entry_id, step, local_path, attempt))
+    _release_batched(gone)
+
+    restored = 0
+    with _batch_lock:
+        for entry_id, step, local_path, attempt in held:
+            # Still in memory when recovery reruns in the same process
+            if (entry_id, step) not in _batch:
+                _batch[(entry_id, step)] = (local_path, attempt)
+                restored += 1
+    if not restored:
+        return 0
+    _schedule_flush(data_node_url, 0)
+    print(f"♻️ Restored {restored} batched uploads")
+    return restored
 
-            print(f"Data Checksum: {data_checksum}")
-            print(f"Compute Checksum: {compute_checksum}")
-            #if data_checksum and data_checksum == compute_checksum:
-            print(f"✅ Upload verified: {entry_id}_{step}")
-            return True
+def upload_batch_attempt(items, data_node_url: str) -> set:
+    """POST items as one multipart request. Returns the (entry_id, step) pairs whose checksum the data node matched."""
+    checksums = {}
+    parts = []
+    with ExitStack() as files:
+        for entry_id, step, local_path, _ in items:
+            checksum = _artifact_checksum(entry_id, step, local_path)
+            checksums[(entry_id, step)] = checksum
+            headers = {
+                "X-Video-ID": entry_id,
+                "X-Artifact": step,
+                "X-Ext": "json",
+                "X-Checksum-SHA256": checksum,
+            }
+            f = files.enter_context(open(local_path, "rb"))
+            reader = ThrottledReader(f, os.path.getsize(local_path), upload_limiter, UPLOAD_TRANSFER_BPS, RESULTS)
+            parts.append((f"{entry_id}_{step}", (f"{entry_id}_{step}.json", reader, "application/json", headers)))
 
-        except Exception as e:
-            print(f"⏳ Upload retry {attempt}/{max_attempts} for {entry_id}_{step}: {e}")
-            time.sleep(15)
+        r = data_node.post(data_node_url, "/upload/batch", files=parts, timeout=UPLOAD_TIMEOUT_S)
 
-    return False
+    verified = set()
+    for result in r.json().get("results", []):
+        key = (result.get("video_id"), result.get("artifact"))
+        if key in checksums and result.get("checksum") == checksums[key]:
+            verified.add(key)
+    print(f"✅ Batch upload verified {len(verified)}/{len(items)} artifacts")
+    return verified
 
 def sha256(path):
     h = hashlib.sha256()
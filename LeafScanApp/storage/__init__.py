@@ -1,8 +1,10 @@
 from .Cache import ComputeCache
 from .FSCache import FileSystemComputeCache
-from .CacheMetaStore import get_meta_store
+from .CacheMetaStore import get_meta_store, JOB_EVENTS_PREFIX
 from .Upload import *
+from .Maintenance import schedule_maintenance
 from .Artifacts import ARTIFACTS, artifact_from_filename
+from .Checksum import HashingReader
 from .JobSchema import JOB_SCHEMA, JobFields, JobTypes
 
 __all__ = [
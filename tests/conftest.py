@@ -0,0 +1,52 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "LeafScanApp"))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+# Job stores and the meta store talk to an in-process Redis
+import apscheduler.jobstores.redis as redis_jobstore
+redis_jobstore.Redis = fakeredis.FakeRedis
+
+import config.storage as storage_config
+storage_config.CACHE_LOCATION = tempfile.mkdtemp(prefix="leafscan_test_cache_")
+
+import storage.CacheMetaStore as meta_store
+meta_store.CACHE_LOCATION = storage_config.CACHE_LOCATION
+meta_store._redis = fakeredis.FakeRedis(decode_responses=True)
+
+from core.scheduler import inference_scheduler, upload_scheduler
+from storage import Upload, DataNode
+from storage.StubDataNode import start_stub
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Each test starts with an empty cache and meta store, no queued uploads and fresh breakers."""
+    meta_store._redis.flushall()
+    meta_store.get_meta_store().backend.clear()
+    yield
+    # The schedulers are never started here: jobs stay pending for the test to inspect
+    inference_scheduler.remove_all_jobs()
+    upload_scheduler.remove_all_jobs()
+    with Upload._batch_lock:
+        Upload._batch.clear()
+        Upload._flush_at = None
+    DataNode._breakers.clear()
+
+
+@pytest.fixture
+def stub():
+    server = start_stub()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def meta():
+    return meta_store.get_meta_store()
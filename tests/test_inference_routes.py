@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("LeafScan")
+
+from flask import Flask
+
+import routes.inference_routes as inference_routes
+from storage import JobFields
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(inference_routes.inference_bp)
+    return app.test_client()
+
+def _bulk(client, **body):
+    return client.post("/inference/bulk", json=body)
+
+
+def test_bulk_status_pages_through_entries(client, meta):
+    meta.update_field("done", JobFields.OUT_DEFOLIATION)
+    meta.update_field("done", JobFields.RESULT_DEFOLIATION, 12.5)
+    meta.update_field("ready", JobFields.OUT_ORIGINAL)
+    meta.update_field("ready", JobFields.OUT_SIMULATED)
+    entry_ids = ["done", "new", "ready"]
+
+    first = _bulk(client, entry_ids=entry_ids, limit=2).get_json()
+    assert first["next_cursor"] == 2
+    assert [e["status"] for e in first["entries"]] == ["completed", "waiting"]
+    assert first["entries"][0]["defoliation"] == 12.5
+    # Answered results count as fetched
+    assert meta.get_field("done", JobFields.RESULT_FETCHED) == "1"
+
+    second = _bulk(client, entry_ids=entry_ids, cursor=first["next_cursor"], limit=2).get_json()
+    assert second["next_cursor"] is None
+    assert second["entries"] == [{"entry_id": "ready", "status": "queued", "queue": {}}]
+
+
+def test_bulk_status_compact_rows(client, meta):
+    body = _bulk(client, entry_ids=["new"], compact=True).get_json()
+    assert body["columns"] == inference_routes.BULK_COLUMNS
+    (row,) = body["entries"]
+    assert row[:3] == ["new", "waiting", None]
+    assert isinstance(row[3], list) and row[3]
+
+
+def test_bulk_status_rejects_bad_requests(client, monkeypatch):
+    monkeypatch.setattr(inference_routes, "BULK_STATUS_MAX_IDS", 2)
+    assert _bulk(client, entry_ids=["a", "b", "c"]).status_code == 400
+    assert _bulk(client, entry_ids="a").status_code == 400
+    assert _bulk(client, entry_ids=["a"], cursor="x").status_code == 400
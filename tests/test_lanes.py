@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.memory import MemoryJobStore
+
+from core import lanes
+from core.lanes import LaneExecutor
+from storage import JobFields
+
+runs = []
+gate = threading.Event()
+
+def _job(entry_id, state):
+    runs.append((entry_id, state))
+    gate.wait(5)
+
+
+@pytest.fixture
+def lane():
+    runs.clear()
+    gate.clear()
+    executor = LaneExecutor("test_lane", 1)
+    scheduler = BackgroundScheduler(
+        jobstores={"default": MemoryJobStore()},
+        executors={"test_lane": executor},
+        job_defaults={"coalesce": False, "max_instances": 1, "misfire_grace_time": None},
+    )
+    scheduler.start()
+    yield scheduler, executor
+    gate.set()
+    scheduler.shutdown()
+    lanes._lanes.pop("test_lane", None)
+
+def _submit(scheduler, job_id, entry_id, state):
+    return scheduler.add_job(_job, args=[entry_id, state], id=job_id, executor="test_lane")
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+def _settle(scheduler, executor):
+    gate.set()
+    _wait_for(lambda: not executor._running and not executor.depth() and not scheduler.get_jobs())
+
+
+def test_running_job_reruns_once_with_newest_inputs(lane):
+    scheduler, executor = lane
+    _submit(scheduler, "job_e1", "e1", "v1")
+    _wait_for(lambda: "job_e1" in executor._running)
+
+    for state in ("v2", "v3"):
+        job, ahead = executor.claim("job_e1", ["e1", state])
+        assert (job.id, ahead) == ("job_e1", 0)
+
+    gate.set()
+    _wait_for(lambda: len(runs) == 2)
+    _settle(scheduler, executor)
+    assert runs == [("e1", "v1"), ("e1", "v3")]
+
+
+def test_waiting_job_absorbs_resubmissions(lane):
+    scheduler, executor = lane
+    _submit(scheduler, "blocker", "z", None)
+    _wait_for(lambda: "blocker" in executor._running)
+    _submit(scheduler, "job_e1", "e1", "v1")
+    _wait_for(lambda: executor.depth() == 1)
+
+    assert executor.claim("job_e1", ["e1", "v2"])[1] == 0
+    # No new state: the waiting run keeps the inputs it has
+    executor.claim("job_e1", ["e1", None])
+    assert executor.claim("missing", ["e2", "v1"]) is None
+
+    _settle(scheduler, executor)
+    assert runs == [("z", None), ("e1", "v2")]
+
+
+def test_clients_share_the_lane_fairly(lane, meta):
+    scheduler, executor = lane
+    for entry_id, client in [("a1", "A"), ("a2", "A"), ("a3", "A"), ("b1", "B")]:
+        meta.update_field(entry_id, JobFields.CLIENT, client)
+    _submit(scheduler, "blocker", "z", None)
+    _wait_for(lambda: "blocker" in executor._running)
+
+    for entry_id in ("a1", "a2", "a3", "b1"):
+        _submit(scheduler, f"job_{entry_id}", entry_id, None)
+    _wait_for(lambda: executor.depth() == 4)
+
+    _settle(scheduler, executor)
+    # B's one job does not wait behind A's burst
+    assert [entry_id for entry_id, _ in runs] == ["z", "a1", "b1", "a2", "a3"]
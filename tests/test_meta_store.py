@@ -0,0 +1,141 @@
+import time
+
+import pytest
+
+import storage.CacheMetaStore as meta_store
+from core.scheduler import track_running
+from storage import ARTIFACTS, JobFields, JobTypes
+from storage.Eviction import get_eviction_policy
+
+
+def _total(meta):
+    return int(meta.r.get("cache:total_bytes") or 0)
+
+def _write(meta, entry_id, size, step=JobTypes.ORIGINAL_AREA):
+    """An artifact on disk, charged and recorded the way CacheService.save does."""
+    artifact = ARTIFACTS[step]
+    written = meta.backend.put(f"{entry_id}_{step}.json", b"x" * size, entry_id=entry_id)
+    with meta.batch():
+        meta.add_bytes(entry_id, written.delta)
+        meta.update_field(entry_id, artifact.checksum_field, written.digest)
+        meta.update_field(entry_id, artifact.size_field, written.size)
+
+def _set_max_bytes(meta, max_bytes):
+    meta.r.set("cache:max_bytes", max_bytes)
+
+
+def test_byte_deltas_and_reconcile(meta):
+    _write(meta, "e1", 100)
+    _write(meta, "e2", 50)
+    assert _total(meta) == 150
+
+    # Rewriting an artifact charges only the difference
+    _write(meta, "e1", 70)
+    assert _total(meta) == 120
+    assert meta.r.zscore("cache:bytes", "e1") == 70
+
+    meta.r.set("cache:total_bytes", 999)
+    meta.r.hset("job:e2", JobFields.BYTES, 10)
+    meta.r.zadd("cache:bytes", {"e2": 10})
+    drift = meta.reconcile_bytes()
+    assert drift == {"entries": 1, "entry_bytes": 40, "total_bytes": 999 + 40 - 120}
+    assert _total(meta) == 120
+
+
+def test_blob_bytes_charged_once_and_freed_with_last_reference(meta):
+    assert meta.add_blob_ref("d1", 500) == 1
+    assert meta.add_blob_ref("d1", 500) == 2
+    assert _total(meta) == 500
+
+    assert meta.release_blob_ref("d1") == 0
+    assert _total(meta) == 500
+    assert meta.release_blob_ref("d1") == 500
+    assert _total(meta) == 0
+    assert meta.r.hget("cas:refs", "d1") is None
+
+
+def test_stage_claimed_once_per_input_version(meta):
+    stage, version = JobFields.OUT_DEFOLIATION, JobFields.VER_DEFOLIATION
+    upstream = [JobFields.OUT_ORIGINAL, JobFields.OUT_SIMULATED]
+    meta.update_field("e1", JobFields.OUT_ORIGINAL)
+    assert not meta.claim_stage("e1", stage, version, upstream)
+
+    meta.update_field("e1", JobFields.OUT_SIMULATED)
+    assert meta.claim_stage("e1", stage, version, upstream)
+    assert not meta.claim_stage("e1", stage, version, upstream)
+
+    # A failed run gives the claim back for the same inputs
+    meta.release_stage("e1", stage)
+    assert meta.claim_stage("e1", stage, version, upstream)
+
+    # New inputs can be claimed again
+    meta.bump_version("e1", version)
+    assert meta.claim_stage("e1", stage, version, upstream)
+
+    meta.bump_version("e1", version)
+    meta.update_field("e1", stage)
+    assert not meta.claim_stage("e1", stage, version, upstream)
+
+
+@pytest.fixture
+def lru(meta, monkeypatch):
+    monkeypatch.setattr(meta, "eviction_policy", get_eviction_policy("lru"))
+    _set_max_bytes(meta, 1000)
+    for i in range(10):
+        _write(meta, f"e{i}", 100)
+        meta.r.zadd("cache:lru", {f"e{i}": i})
+    return meta
+
+def _evicted(meta, n=10):
+    return [f"e{i}" for i in range(n) if not meta.backend.exists(f"e{i}_{JobTypes.ORIGINAL_AREA}.json", entry_id=f"e{i}")]
+
+
+def test_evicts_least_recent_down_to_low_watermark(lru):
+    # 1000 bytes is above the 0.9 high watermark; 0.75 leaves room for 7 entries
+    assert lru.evict_jobs_for_space()
+    assert _evicted(lru) == ["e0", "e1", "e2"]
+    assert _total(lru) == 700
+    assert lru.r.zcard("cache:evicting") == 0
+
+    # Policy victims keep their metadata, but no longer claim artifacts on disk
+    artifact = ARTIFACTS[JobTypes.ORIGINAL_AREA]
+    fields = lru.get_fields("e0", artifact.size_field, artifact.checksum_field, JobFields.ARTIFACTS_PURGED)
+    assert fields == {artifact.size_field: "0", artifact.checksum_field: "", JobFields.ARTIFACTS_PURGED: "1"}
+
+
+def test_eviction_skips_active_entries(lru):
+    with track_running("e0"), track_running("e2"):
+        assert lru.evict_jobs_for_space()
+    assert _evicted(lru) == ["e1", "e3", "e4"]
+
+
+def test_eviction_pages_past_protected_windows(lru, monkeypatch):
+    monkeypatch.setattr(meta_store, "EVICTION_SCAN_WINDOW", 2)
+    with track_running("e0"), track_running("e1"), track_running("e2"), track_running("e3"):
+        assert lru.evict_jobs_for_space()
+    assert _evicted(lru) == ["e4", "e5", "e6"]
+
+
+def test_eviction_reports_when_target_is_out_of_reach(lru):
+    running = [track_running(f"e{i}") for i in range(9)]
+    for r in running:
+        r.__enter__()
+    try:
+        assert not lru.evict_jobs_for_space()
+    finally:
+        for r in running:
+            r.__exit__(None, None, None)
+    assert _evicted(lru) == ["e9"]
+
+
+def test_expired_entries_are_swept_whatever_the_size(meta):
+    _set_max_bytes(meta, 10 ** 9)
+    _write(meta, "old", 10)
+    _write(meta, "new", 10)
+    meta.r.zadd("cache:expired", {"old": time.time() - 1})
+
+    meta.sweep_expired()
+    assert not meta.r.exists("job:old")
+    assert meta.r.zscore("cache:expired", "old") is None
+    assert meta.r.exists("job:new")
+    assert _total(meta) == 10
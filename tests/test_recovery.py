@@ -0,0 +1,74 @@
+import hashlib
+
+import pytest
+
+pytest.importorskip("LeafScan")
+
+from core.cache import get_cache
+from core.recovery import recover_jobs
+from core.scheduler import inference_scheduler, upload_scheduler, inference_jobstore, upload_jobstore, queued_job_ids
+from storage import ARTIFACTS, JobFields, JobTypes, Upload
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schedulers():
+    # Paused: recovered jobs land in the job stores and never run
+    for scheduler in (inference_scheduler, upload_scheduler):
+        scheduler.start(paused=True)
+    yield
+    for scheduler in (inference_scheduler, upload_scheduler):
+        # Nothing left for the scheduler thread to process on its way out
+        scheduler.remove_all_jobs()
+        scheduler.shutdown(wait=False)
+
+
+def _write(cache, entry_id, step, data: bytes):
+    path = cache.artifact_path(entry_id, step)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    artifact = ARTIFACTS[step]
+    with cache.meta.batch():
+        cache.meta.add_bytes(entry_id, len(data))
+        cache.meta.update_field(entry_id, artifact.checksum_field, hashlib.sha256(data).hexdigest())
+        cache.meta.update_field(entry_id, artifact.size_field, len(data))
+
+
+def test_recovery_is_safe_to_run_twice(meta):
+    cache = get_cache()
+    # Inputs for original area, never computed
+    meta.update_field("e1", JobFields.IN_LEAF)
+    meta.update_field("e1", JobFields.IN_WIDTHS)
+    # A result and a video on disk, never uploaded
+    meta.update_field("e2", JobFields.OUT_ORIGINAL)
+    _write(cache, "e2", JobTypes.ORIGINAL_AREA, b'{"area": 1}')
+    meta.update_field("e2", JobFields.IN_VIDEO)
+    _write(cache, "e2", JobTypes.VIDEO, b"\x00" * 64)
+    # A result whose files were evicted
+    meta.update_field("e3", JobFields.OUT_ORIGINAL)
+    _write(cache, "e3", JobTypes.ORIGINAL_AREA, b'{"area": 3}')
+    meta.purge_job_artifacts("e3")
+
+    first = recover_jobs()
+    inference_jobs = sorted(queued_job_ids(inference_jobstore))
+    upload_jobs = sorted(queued_job_ids(upload_jobstore))
+    second = recover_jobs()
+
+    assert first == second == {"entries": 3, "inference": 1, "uploads": 2, "batched": 0}
+    assert inference_jobs == sorted(queued_job_ids(inference_jobstore)) == ["original_e1"]
+    # The video goes on its own; the small result waits for one batch flush
+    assert sorted(queued_job_ids(upload_jobstore)) == upload_jobs
+    assert "upload_e2_video" in upload_jobs
+    assert len([job_id for job_id in upload_jobs if job_id.startswith("upload_batch_")]) == 1
+    assert list(Upload._batch) == [("e2", JobTypes.ORIGINAL_AREA)]
+    assert meta.held_batched() == [("e2", JobTypes.ORIGINAL_AREA, str(cache.artifact_path("e2", JobTypes.ORIGINAL_AREA)), 1)]
+
+
+def test_recovery_restores_batched_uploads_first(meta):
+    cache = get_cache()
+    meta.update_field("e1", JobFields.OUT_ORIGINAL)
+    _write(cache, "e1", JobTypes.ORIGINAL_AREA, b'{"area": 1}')
+    # Held by a process that died on its third attempt
+    meta.hold_batched("e1", JobTypes.ORIGINAL_AREA, cache.artifact_path("e1", JobTypes.ORIGINAL_AREA), 3)
+
+    assert recover_jobs()["batched"] == 1
+    assert Upload._batch == {("e1", JobTypes.ORIGINAL_AREA): (cache.artifact_path("e1", JobTypes.ORIGINAL_AREA), 3)}
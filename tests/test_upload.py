@@ -0,0 +1,179 @@
+import hashlib
+import time
+
+import pytest
+import requests
+
+from core.scheduler import upload_scheduler
+from storage import ARTIFACTS, JobTypes, Upload, DataNode
+from storage.DataNode import DataNodeDown
+
+
+def _write_artifact(tmp_path, meta, entry_id, step, data: bytes, checksum: str = None):
+    """Write an artifact and record its checksum and size, as the cache does on write."""
+    artifact = ARTIFACTS[step]
+    path = tmp_path / f"{entry_id}_{step}.json"
+    path.write_bytes(data)
+    meta.update_field(entry_id, artifact.checksum_field, checksum or hashlib.sha256(data).hexdigest())
+    meta.update_field(entry_id, artifact.size_field, len(data))
+    return path
+
+def _faults(stub, **faults):
+    requests.post(f"{stub.url}/faults", json=faults).raise_for_status()
+
+def _uploaded(meta, entry_id, step):
+    return meta.get_fields(entry_id, ARTIFACTS[step].upload_flag)[ARTIFACTS[step].upload_flag] == "1"
+
+def _retry_job(entry_id, step):
+    return upload_scheduler.get_job(f"upload_{entry_id}_{step}")
+
+
+def test_failed_upload_is_rescheduled_with_backoff(tmp_path, meta, stub):
+    step = JobTypes.ORIGINAL_AREA
+    path = _write_artifact(tmp_path, meta, "e1", step, b'{"area": 1}')
+    _faults(stub, fail=1)
+
+    assert Upload.upload_with_mark("e1", step, path, stub.url) is False
+    job = _retry_job("e1", step)
+    assert job is not None
+    assert job.args[4] == 2
+    # Never due immediately: the running job must finish before its id comes up again
+    assert job.trigger.run_date.timestamp() >= time.time() + 0.5
+    assert not _uploaded(meta, "e1", step)
+
+    assert Upload.upload_with_mark(*job.args) is True
+    assert _uploaded(meta, "e1", step)
+    assert (stub.root / f"e1_{step}.json").read_bytes() == b'{"area": 1}'
+
+
+def test_breaker_opens_then_probes_and_closes(monkeypatch, stub):
+    monkeypatch.setattr(DataNode, "UPLOAD_BREAKER_THRESHOLD", 2)
+    monkeypatch.setattr(DataNode, "UPLOAD_BREAKER_COOLDOWN_S", 0.2)
+    monkeypatch.setattr(DataNode, "UPLOAD_BREAKER_MAX_COOLDOWN_S", 1.0)
+    breaker = DataNode.get_breaker(stub.url)
+    upload = lambda: DataNode.post(stub.url, "/upload", data=b"x", headers={"X-Video-ID": "e1"})
+
+    _faults(stub, fail=3)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            upload()
+    assert breaker.state()["state"] == "open"
+
+    # Open: fails fast without reaching the node
+    with pytest.raises(DataNodeDown):
+        upload()
+    assert requests.get(f"{stub.url}/stats").json()["failed"] == 2
+
+    # A failed probe reopens with a doubled cooldown
+    time.sleep(0.25)
+    assert breaker.state()["state"] == "half_open"
+    with pytest.raises(requests.HTTPError):
+        upload()
+    assert breaker.state()["state"] == "open"
+    assert breaker.state()["cooldown_s"] == pytest.approx(0.4)
+
+    time.sleep(0.45)
+    assert breaker.state()["state"] == "half_open"
+    upload()
+    assert breaker.state() == {"state": "closed", "consecutive_failures": 0, "cooldown_s": 0.2, "retry_in_s": 0.0}
+
+
+def test_checksum_mismatch_is_not_marked_uploaded(tmp_path, meta, stub):
+    step = JobTypes.ORIGINAL_AREA
+    path = _write_artifact(tmp_path, meta, "e1", step, b'{"area": 1}', checksum="0" * 64)
+
+    assert Upload.upload_with_mark("e1", step, path, stub.url) is False
+    assert requests.get(f"{stub.url}/stats").json()["failed"] == 1
+    assert not _uploaded(meta, "e1", step)
+    assert _retry_job("e1", step).args[4] == 2
+
+
+def test_checksum_mismatch_from_node_that_stored_other_bytes(tmp_path, meta, stub, monkeypatch):
+    step = JobTypes.ORIGINAL_AREA
+    path = _write_artifact(tmp_path, meta, "e1", step, b'{"area": 1}')
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"checksum": "%s"}' % (b"f" * 64)
+    monkeypatch.setattr(Upload.data_node, "post", lambda *a, **k: response)
+
+    with pytest.raises(Upload.ChecksumMismatch):
+        Upload.upload_attempt("e1", step, path, stub.url)
+    # The next ranged attempt starts over instead of completing the bad copy
+    assert f"upload_e1_{step}" in Upload._restart_ranged
+    Upload._restart_ranged.clear()
+
+
+@pytest.mark.parametrize("ranged", [False, True])
+def test_upload_without_checksum_is_retried(tmp_path, meta, stub, monkeypatch, ranged):
+    if ranged:
+        monkeypatch.setattr(Upload, "UPLOAD_RANGED_MIN_BYTES", 1)
+    step = JobTypes.ORIGINAL_AREA
+    path = _write_artifact(tmp_path, meta, "e1", step, b'{"area": 1}')
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"status": "success", "received": 11}'
+    monkeypatch.setattr(Upload.data_node, "post", lambda *a, **k: response)
+
+    assert Upload.upload_with_mark("e1", step, path, stub.url) is False
+    assert not _uploaded(meta, "e1", step)
+    assert _retry_job("e1", step).args[4] == 2
+    Upload._restart_ranged.clear()
+
+
+def test_batch_marks_only_verified_items(tmp_path, meta, stub):
+    step = JobTypes.ORIGINAL_AREA
+    good = _write_artifact(tmp_path, meta, "good", step, b'{"area": 1}')
+    bad = _write_artifact(tmp_path, meta, "bad", step, b'{"area": 2}', checksum="0" * 64)
+    Upload._queue_batched("good", step, good, stub.url)
+    Upload._queue_batched("bad", step, bad, stub.url)
+
+    Upload.flush_upload_batch(stub.url)
+
+    assert requests.get(f"{stub.url}/stats").json()["batches"] == 1
+    assert _uploaded(meta, "good", step)
+    assert not _uploaded(meta, "bad", step)
+    # The mismatched item waits for a later batch with its attempt spent
+    assert Upload._batch == {("bad", step): (bad, 2)}
+    assert meta.held_batched() == [("bad", step, str(bad), 2)]
+    assert not (stub.root / f"bad_{step}.json").exists()
+
+
+def test_batch_survives_a_restart(tmp_path, meta, stub):
+    step = JobTypes.DEFOLIATION
+    path = _write_artifact(tmp_path, meta, "e1", step, b'{"defoliation": 3}')
+    Upload._queue_batched("e1", step, path, stub.url, attempt=3)
+    # The process dies before the flush
+    Upload._batch.clear()
+    Upload._flush_at = None
+    upload_scheduler.remove_all_jobs()
+
+    assert Upload.restore_upload_batch(stub.url) == 1
+    assert Upload._batch == {("e1", step): (path, 3)}
+    # Queued again by the recovery scan: absorbed by the restored item
+    Upload._queue_batched("e1", step, path, stub.url)
+    assert Upload._batch == {("e1", step): (path, 3)}
+
+    Upload.flush_upload_batch(stub.url)
+    assert _uploaded(meta, "e1", step)
+    assert meta.held_batched() == []
+
+
+def test_ranged_upload_resumes_after_cut(tmp_path, meta, stub, monkeypatch):
+    monkeypatch.setattr(Upload, "UPLOAD_RANGED_MIN_BYTES", 1000)
+    monkeypatch.setattr(Upload, "UPLOAD_CHUNK_BYTES", 400)
+    step = JobTypes.SIMULATED_AREA
+    data = bytes(range(256)) * 6
+    path = _write_artifact(tmp_path, meta, "e1", step, data)
+    _faults(stub, cut_after=100)
+
+    assert Upload.upload_with_mark("e1", step, path, stub.url) is False
+    held = (stub.root / f"e1_{step}.json").stat().st_size
+    assert 0 < held < len(data)
+
+    job = _retry_job("e1", step)
+    assert Upload.upload_with_mark(*job.args) is True
+    assert (stub.root / f"e1_{step}.json").read_bytes() == data
+    assert _uploaded(meta, "e1", step)
+    # Resumed where the cut left off rather than resending from byte 0
+    ranges = -(-(len(data) - held) // 400)
+    assert requests.get(f"{stub.url}/stats").json()["ranges"] == ranges